@@ -7,6 +7,9 @@ import RAG.model_api as model_api
 import threading
 
 import RAG.data_ingestion as data_ingest
+from RAG import hooks
+
+hooks.use_streamlit()
 
 def get_file_hash(file_object):
     file_bytes = file_object.read()
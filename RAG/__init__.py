@@ -1,3 +1,10 @@
-from . import indexing
-from . import embed_model_api
-from . import model_api
\ No newline at end of file
+import importlib
+
+# Submodules load on first access so `import RAG` stays cheap for CLIs and workers.
+_SUBMODULES = {"indexing", "embed_model_api", "model_api"}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
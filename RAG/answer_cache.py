@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+from logger import logging
+
+CACHE_DIR = os.path.join(os.getcwd(), "cache")
+ANSWER_CACHE_PATH = os.path.join(CACHE_DIR, "answers.sqlite")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+
+
+def normalize_query(query):
+    query = " ".join(query.lower().split())
+    return re.sub(r"[\s?!.]+$", "", query)
+
+
+class AnswerCache:
+    """Answers keyed by exact query hash, with an embedding-similarity fallback.
+
+    Entries are scoped to a collection, its index version and an LLM, so an answer is
+    only served for the same documents it was generated from.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, threshold=ANSWER_CACHE_THRESHOLD):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._matrices = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY,"
+            " collection TEXT NOT NULL DEFAULT '',"
+            " index_version INTEGER NOT NULL,"
+            " model TEXT NOT NULL,"
+            " query_hash TEXT NOT NULL,"
+            " embedding BLOB,"
+            " answer TEXT NOT NULL,"
+            " sources TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(answers)")]
+        if "collection" not in columns:
+            self._conn.execute("ALTER TABLE answers ADD COLUMN collection TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("DROP INDEX IF EXISTS idx_answers_scope")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_answers_collection_scope "
+            "ON answers(collection, index_version, model, query_hash)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(query):
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def _scope_matrix(self, collection, index_version, model):
+        """Row ids and unit-normalized query embeddings for one scope, cached in memory."""
+        scope = (collection, index_version, model)
+        if scope not in self._matrices:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM answers WHERE collection = ? AND index_version = ? "
+                "AND model = ? AND embedding IS NOT NULL", scope
+            ).fetchall()
+            ids = [row_id for row_id, _ in rows]
+            matrix = (np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                      if rows else np.zeros((0, 0), dtype=np.float32))
+            # Only the most recently used scope of each collection stays in memory.
+            self._matrices = {s: m for s, m in self._matrices.items() if s[0] != collection}
+            self._matrices[scope] = (ids, matrix)
+        return self._matrices[scope]
+
+    def lookup(self, query, index_version, model, query_embedding=None, collection=""):
+        """Returns (answer, source_nodes) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, sources FROM answers WHERE collection = ? AND index_version = ? "
+                "AND model = ? AND query_hash = ? ORDER BY id DESC LIMIT 1",
+                (collection, index_version, model, self._hash(query))
+            ).fetchone()
+
+            if row is None and query_embedding is not None:
+                ids, matrix = self._scope_matrix(collection, index_version, model)
+                if len(ids):
+                    vector = np.asarray(query_embedding, dtype=np.float32)
+                    similarities = matrix @ (vector / (np.linalg.norm(vector) or 1.0))
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        row = self._conn.execute(
+                            "SELECT answer, sources FROM answers WHERE id = ?", (ids[best],)
+                        ).fetchone()
+
+        if row is None:
+            return None
+        answer, sources = row
+        return answer, [NodeWithScore(node=json_to_doc(n["node"]), score=n["score"])
+                        for n in json.loads(sources)]
+
+    def store(self, query, index_version, model, answer, source_nodes, query_embedding=None, collection=""):
+        blob = None
+        if query_embedding is not None:
+            vector = np.asarray(query_embedding, dtype=np.float32)
+            blob = (vector / (np.linalg.norm(vector) or 1.0)).tobytes()
+        sources = json.dumps([{"node": doc_to_json(n.node), "score": n.score} for n in source_nodes])
+
+        with self._lock:
+            # Answers for older index versions can never be served again.
+            self._conn.execute("DELETE FROM answers WHERE collection = ? AND index_version < ?", 
+                               (collection, index_version))
+            self._conn.execute(
+                "INSERT INTO answers (collection, index_version, model, query_hash, embedding, answer, sources, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (collection, index_version, model, self._hash(query), blob, answer, sources, time.time())
+            )
+            self._conn.commit()
+            self._matrices.pop((collection, index_version, model), None)
+        logging.info(f"Cached answer for {collection or 'default'} index version {index_version} ({model})")
+
+    def drop_collection(self, collection):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE collection = ?", (collection,))
+            self._conn.commit()
+            self._matrices = {s: m for s, m in self._matrices.items() if s[0] != collection}
@@ -0,0 +1,480 @@
+import os
+import re
+import glob
+import json
+import shutil
+from array import array
+from collections import Counter
+from typing import List
+
+import numpy as np
+import Stemmer
+from bm25s.stopwords import STOPWORDS_EN
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from logger import logging
+
+BM25_DIR = os.path.join(os.getcwd(), "storage", "bm25")
+BM25_MAX_SEGMENTS = int(os.getenv("BM25_MAX_SEGMENTS", 8))
+BM25_COMPACT_RATIO = float(os.getenv("BM25_COMPACT_RATIO", 0.25))  # deleted share of rows that triggers compaction
+COMMIT_FILE = "CURRENT"
+TABLES = ("vocab.txt", "docs.txt", "doc_len.bin", "deleted.bin")
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+STOPWORDS = set(STOPWORDS_EN)
+
+
+class Tokenizer:
+    """Same tokenization as llama_index's BM25Retriever: word tokens, English stopwords, Snowball stems."""
+
+    def __init__(self, language="english"):
+        self.stemmer = Stemmer.Stemmer(language)
+
+    def __call__(self, text):
+        tokens = [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+        return self.stemmer.stemWords(tokens)
+
+
+class Segment:
+    """Immutable block of postings in CSR layout, sorted by term id.
+
+    term_ids[i]'s postings are docs[offsets[i]:offsets[i + 1]] with frequencies in tfs.
+    """
+
+    def __init__(self, term_ids, offsets, docs, tfs, path=None):
+        self.term_ids = term_ids
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.path = path
+
+    @classmethod
+    def from_postings(cls, terms, docs, tfs):
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        term_ids, counts = np.unique(terms, return_counts=True)
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        return cls(term_ids.astype(np.uint32), offsets, docs.astype(np.uint32),
+                   np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16))
+
+    @classmethod
+    def build(cls, doc_terms):
+        """doc_terms: list of (doc_number, Counter of term ids)."""
+        terms, docs, tfs = [], [], []
+        for doc, counts in doc_terms:
+            terms.extend(counts.keys())
+            tfs.extend(counts.values())
+            docs.extend([doc] * len(counts))
+        return cls.from_postings(np.array(terms, dtype=np.int64),
+                                 np.array(docs, dtype=np.int64),
+                                 np.array(tfs, dtype=np.int64))
+
+    @classmethod
+    def merge(cls, segments, alive):
+        """Combines segments into one, dropping postings of deleted documents."""
+        terms = np.concatenate([np.repeat(s.term_ids, np.diff(s.offsets)) for s in segments])
+        docs = np.concatenate([np.asarray(s.docs) for s in segments])
+        tfs = np.concatenate([np.asarray(s.tfs) for s in segments])
+        mask = alive[docs]
+        return cls.from_postings(terms[mask], docs[mask], tfs[mask])
+
+    def __len__(self):
+        return len(self.docs)
+
+    def postings(self, term_id):
+        i = np.searchsorted(self.term_ids, term_id)
+        if i == len(self.term_ids) or self.term_ids[i] != term_id:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ("term_ids", "offsets", "docs", "tfs"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                  for name in ("term_ids", "offsets", "docs", "tfs")]
+        return cls(*arrays, path=path)
+
+
+class BM25Index:
+    """Append/delete BM25 keyword index persisted as memory-mapped postings segments.
+
+    Each add writes a new small segment and appends to the vocabulary and document
+    tables, so indexing a document costs work proportional to that document. Deletes
+    are tombstones. Segments are merged once there are more than BM25_MAX_SEGMENTS, and
+    once more than BM25_COMPACT_RATIO of the rows are deleted the index is compacted.
+
+    On disk, the CURRENT file is the commit point: it names the generation directory
+    holding the tables and segments, the committed byte size of every table and the
+    live segments. It is replaced atomically after each change, so a loader never sees
+    a half-written add, merge or compaction, and writers drop whatever a crash left
+    beyond it.
+
+    A read_only index never writes to persist_dir: it is how readers open the directory
+    of a collection that an ingestion may be appending to.
+    """
+
+    def __init__(self, persist_dir=None, k1=1.5, b=0.75, language="english", read_only=False):
+        self.persist_dir = persist_dir
+        self.read_only = read_only
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = Tokenizer(language)
+        self.vocab = {}
+        self.node_ids = []
+        self.doc_numbers = {}
+        self.doc_len = array("I")
+        self.deleted = set()
+        self.segments = []
+        self.generation = "gen_000001"
+        self._sizes = dict.fromkeys(TABLES, 0)
+        self._total_len = 0
+        self._alive = None
+
+    @property
+    def num_docs(self):
+        return len(self.node_ids) - len(self.deleted)
+
+    def _alive_mask(self):
+        if self._alive is None or len(self._alive) != len(self.node_ids):
+            alive = np.ones(len(self.node_ids), dtype=bool)
+            if self.deleted:
+                alive[list(self.deleted)] = False
+            self._alive = alive
+        return self._alive
+
+    #----------Updates--------------
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"BM25 index {self.persist_dir} was loaded read-only")
+
+    def _persisting(self):
+        return bool(self.persist_dir) and not self.read_only
+
+    def add_nodes(self, nodes):
+        self._check_writable()
+        self._add_nodes(nodes)
+
+    def delete_nodes(self, node_ids):
+        self._check_writable()
+        self._delete_nodes(node_ids)
+
+    def reconcile(self, docs):
+        """Matches the corpus to `docs`, a node id -> node mapping such as a docstore's.
+
+        Drops the nodes docs lacks and adds the ones it has that are missing here.
+        Returns (stray, missing) counts. A read_only index only changes in memory.
+        """
+        stray = [node_id for node_id in self.doc_numbers if node_id not in docs]
+        missing = [node for node_id, node in docs.items() if node_id not in self.doc_numbers]
+        if stray:
+            self._delete_nodes(stray)
+        if missing:
+            self._add_nodes(missing)
+        return len(stray), len(missing)
+
+    def _add_nodes(self, nodes):
+        replaced = [n.node_id for n in nodes if n.node_id in self.doc_numbers]
+        if replaced:
+            self._delete_nodes(replaced)
+
+        new_terms = []
+        doc_terms = []
+        start_doc = len(self.node_ids)
+        for node in nodes:
+            tokens = self.tokenizer(node.get_content(metadata_mode=MetadataMode.EMBED))
+            counts = Counter()
+            for token in tokens:
+                term_id = self.vocab.get(token)
+                if term_id is None:
+                    term_id = self.vocab[token] = len(self.vocab)
+                    new_terms.append(token)
+                counts[term_id] += 1
+            doc = len(self.node_ids)
+            self.doc_numbers[node.node_id] = doc
+            self.node_ids.append(node.node_id)
+            self.doc_len.append(len(tokens))
+            self._total_len += len(tokens)
+            doc_terms.append((doc, counts))
+
+        if not doc_terms:
+            return
+        segment = Segment.build(doc_terms)
+        self.segments.append(segment)
+        self._alive = None
+
+        if self._persisting():
+            self._append_tables(new_terms, start_doc)
+            segment.save(self._next_segment_path())
+            self._commit()
+        if len(self.segments) > BM25_MAX_SEGMENTS:
+            # Merging only the smaller half keeps the amortized cost of an add logarithmic.
+            self._merge_segments(count=BM25_MAX_SEGMENTS // 2 + 1)
+
+    def _delete_nodes(self, node_ids):
+        removed = []
+        for node_id in node_ids:
+            doc = self.doc_numbers.pop(node_id, None)
+            if doc is None or doc in self.deleted:
+                continue
+            self.deleted.add(doc)
+            self._total_len -= self.doc_len[doc]
+            removed.append(doc)
+        self._alive = None
+        if not removed:
+            return
+
+        if self._persisting():
+            self._append_table("deleted.bin", array("I", removed).tobytes())
+            self._commit()
+        if len(self.deleted) > BM25_COMPACT_RATIO * len(self.node_ids):
+            self._compact()
+
+    def merge_segments(self, count=None):
+        """Merges the `count` smallest segments (all by default) into one."""
+        self._check_writable()
+        self._merge_segments(count)
+
+    def _merge_segments(self, count=None):
+        by_size = sorted(self.segments, key=len)
+        to_merge = by_size if count is None else by_size[:count]
+        merged = Segment.merge(to_merge, self._alive_mask())
+        old_paths = [s.path for s in to_merge if s.path]
+        self.segments = [s for s in self.segments if s not in to_merge] + [merged]
+        if self._persisting():
+            merged.save(self._next_segment_path())
+            self._commit()
+            for path in old_paths:
+                shutil.rmtree(path, ignore_errors=True)
+        logging.info(f"Merged {len(to_merge)} BM25 segments into one with {len(merged)} postings")
+
+    def compact(self):
+        """Rewrites the index without its deleted rows; see _compact."""
+        self._check_writable()
+        self._compact()
+
+    def _compact(self):
+        """Renumbers the live rows, drops terms no live row uses and merges every segment.
+
+        On disk the result is a new generation that one commit swaps in for the old one.
+        """
+        alive = self._alive_mask()
+        keep = np.flatnonzero(alive)
+        renumber = np.zeros(len(self.node_ids), dtype=np.int64)
+        renumber[keep] = np.arange(len(keep))
+
+        terms = [np.repeat(np.asarray(s.term_ids, dtype=np.int64), np.diff(s.offsets)) for s in self.segments]
+        docs = [np.asarray(s.docs, dtype=np.int64) for s in self.segments]
+        tfs = [np.asarray(s.tfs, dtype=np.int64) for s in self.segments]
+        terms, docs, tfs = (np.concatenate(a) if a else np.zeros(0, dtype=np.int64) for a in (terms, docs, tfs))
+        mask = alive[docs]
+        terms, docs, tfs = terms[mask], docs[mask], tfs[mask]
+
+        used = np.unique(terms)
+        term_map = np.zeros(len(self.vocab), dtype=np.int64)
+        term_map[used] = np.arange(len(used))
+        terms_by_id = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms_by_id[term_id] = term
+
+        dropped = len(self.deleted)
+        self.vocab = {terms_by_id[t]: i for i, t in enumerate(used.tolist())}
+        self.node_ids = [self.node_ids[d] for d in keep.tolist()]
+        self.doc_len = array("I", (self.doc_len[d] for d in keep.tolist()))
+        self.doc_numbers = {node_id: doc for doc, node_id in enumerate(self.node_ids)}
+        self.deleted = set()
+        self._alive = None
+        self._total_len = int(sum(self.doc_len))
+        segment = Segment.from_postings(term_map[terms], renumber[docs], tfs)
+        self.segments = [segment] if len(segment) else []
+
+        if self._persisting():
+            self._write_generation()
+        logging.info(f"Compacted BM25 index: dropped {dropped} deleted rows, {len(self.node_ids)} remain")
+
+    #----------Search--------------
+    def search(self, query, top_k=5):
+        """Returns [(node_id, score)] of the best top_k live documents."""
+        if not self.num_docs:
+            return []
+        alive = self._alive_mask()
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)
+        avgdl = self._total_len / self.num_docs or 1.0
+        n = self.num_docs
+        scores = np.zeros(len(self.node_ids), dtype=np.float32)
+
+        for token in set(self.tokenizer(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            parts = [p for p in (s.postings(term_id) for s in self.segments) if p is not None]
+            if not parts:
+                continue
+            docs = np.concatenate([p[0] for p in parts])
+            tfs = np.concatenate([p[1] for p in parts]).astype(np.float32)
+            mask = alive[docs]
+            docs, tfs = docs[mask], tfs[mask]
+            df = len(docs)
+            if df == 0:
+                continue
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avgdl)
+            scores[docs] += idf * tfs / (tfs + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.node_ids[d], float(scores[d])) for d in candidates]
+
+    #----------Persistence--------------
+    def _generation_dir(self, generation=None):
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.persist_dir, generation) if generation else self.persist_dir
+
+    def _next_segment_path(self):
+        existing = glob.glob(os.path.join(self._generation_dir(), "seg_*"))
+        numbers = [int(os.path.basename(p)[4:]) for p in existing]
+        return os.path.join(self._generation_dir(), f"seg_{max(numbers, default=0) + 1:06d}")
+
+    def _append_table(self, name, data):
+        os.makedirs(self._generation_dir(), exist_ok=True)
+        with open(os.path.join(self._generation_dir(), name), "ab") as f:
+            f.write(data)
+            self._sizes[name] = f.tell()
+
+    def _append_tables(self, new_terms, start_doc):
+        self._append_table("vocab.txt", "".join(f"{term}\n" for term in new_terms).encode("utf-8"))
+        self._append_table("docs.txt", "".join(f"{node_id}\n" for node_id in self.node_ids[start_doc:]).encode("utf-8"))
+        self._append_table("doc_len.bin", self.doc_len[start_doc:].tobytes())
+
+    def _commit(self):
+        """Atomically records the tables' sizes and the live segments as the index's state."""
+        commit = {"generation": self.generation,
+                  "segments": [os.path.basename(s.path) for s in self.segments if s.path],
+                  "sizes": self._sizes}
+        path = os.path.join(self.persist_dir, COMMIT_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(commit, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _write_generation(self):
+        """Writes the whole index into the next generation, commits it and removes the old one."""
+        old_generation = self.generation
+        number = int(old_generation[4:]) if old_generation else 0
+        self.generation = f"gen_{number + 1:06d}"
+        shutil.rmtree(self._generation_dir(), ignore_errors=True)
+        self._sizes = dict.fromkeys(TABLES, 0)
+        self._append_tables(list(self.vocab), 0)
+        for segment in self.segments:
+            segment.save(self._next_segment_path())
+        self._commit()
+        self._remove_generation(old_generation)
+
+    def _remove_generation(self, generation):
+        if generation:
+            shutil.rmtree(self._generation_dir(generation), ignore_errors=True)
+            return
+        # Indexes written before generations kept their tables and segments in persist_dir.
+        for name in TABLES:
+            if os.path.exists(os.path.join(self.persist_dir, name)):
+                os.remove(os.path.join(self.persist_dir, name))
+        for path in glob.glob(os.path.join(self.persist_dir, "seg_*")):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _recover(self, committed):
+        """Writer-side cleanup: drops table tails, segments and generations no commit names."""
+        generation_dir = self._generation_dir()
+        for name, size in self._sizes.items():
+            path = os.path.join(generation_dir, name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+        live = {os.path.basename(s.path) for s in self.segments}
+        for path in glob.glob(os.path.join(generation_dir, "seg_*")):
+            if os.path.basename(path) not in live:
+                shutil.rmtree(path, ignore_errors=True)
+        for path in glob.glob(os.path.join(self.persist_dir, "gen_*")):
+            if os.path.basename(path) != self.generation:
+                shutil.rmtree(path, ignore_errors=True)
+        if not committed:
+            self._commit()
+
+    @classmethod
+    def exists(cls, persist_dir=BM25_DIR):
+        return (os.path.exists(os.path.join(persist_dir, COMMIT_FILE))
+                or os.path.exists(os.path.join(persist_dir, "docs.txt")))
+
+    @classmethod
+    def load(cls, persist_dir=BM25_DIR, **kwargs):
+        """Opens the committed state of a persisted index; read_only=True never writes to persist_dir."""
+        for attempt in range(3):
+            try:
+                return cls._load(persist_dir, **kwargs)
+            except FileNotFoundError:
+                # A writer merged or compacted away the segments named by the commit we read.
+                if attempt == 2:
+                    raise
+
+    @classmethod
+    def _load(cls, persist_dir, **kwargs):
+        index = cls(persist_dir=persist_dir, **kwargs)
+        commit_path = os.path.join(persist_dir, COMMIT_FILE)
+        committed = os.path.exists(commit_path)
+        if committed:
+            with open(commit_path, "r", encoding="utf-8") as f:
+                commit = json.load(f)
+            index.generation = commit["generation"]
+            index._sizes = {name: commit["sizes"].get(name, 0) for name in TABLES}
+            segment_names = commit["segments"]
+        else:
+            index.generation = ""
+            index._sizes = {name: os.path.getsize(os.path.join(persist_dir, name))
+                            if os.path.exists(os.path.join(persist_dir, name)) else 0 for name in TABLES}
+            segment_names = sorted(os.path.basename(p) for p in glob.glob(os.path.join(persist_dir, "seg_*")))
+        generation_dir = index._generation_dir()
+
+        def read_table(name):
+            path = os.path.join(generation_dir, name)
+            if not index._sizes[name]:
+                return b""
+            with open(path, "rb") as f:
+                return f.read(index._sizes[name])
+
+        index.vocab = {term: i for i, term in enumerate(read_table("vocab.txt").decode("utf-8").splitlines())}
+        index.node_ids = read_table("docs.txt").decode("utf-8").splitlines()
+        index.doc_len.frombytes(read_table("doc_len.bin"))
+        index.deleted = set(np.frombuffer(read_table("deleted.bin"), dtype=np.uint32).tolist())
+
+        index.doc_numbers = {node_id: doc for doc, node_id in enumerate(index.node_ids)
+                             if doc not in index.deleted}
+        index._total_len = int(sum(index.doc_len)) - sum(index.doc_len[d] for d in index.deleted)
+        index.segments = [Segment.load(os.path.join(generation_dir, name)) for name in segment_names]
+        if not index.read_only:
+            index._recover(committed)
+        return index
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Keyword retriever over a BM25Index that resolves hits from the index docstore."""
+
+    def __init__(self, bm25_index, docstore, similarity_top_k=5, **kwargs):
+        self.bm25_index = bm25_index
+        self.docstore = docstore
+        self.similarity_top_k = similarity_top_k
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        hits = self.bm25_index.search(query_bundle.query_str, top_k=self.similarity_top_k)
+        results = []
+        for node_id, score in hits:
+            node = self.docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                results.append(NodeWithScore(node=node, score=score))
+        return results
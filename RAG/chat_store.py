@@ -0,0 +1,67 @@
+import os
+import json
+import threading
+
+from RAG import hooks
+from RAG.index_manager import COLLECTIONS_DIR
+
+CHATS_PATH = os.path.join(COLLECTIONS_DIR, "chats.json")
+
+
+def chat_collection(chat):
+    """Collection a chat searches: its own id, or None for the shared storage/ index."""
+    return chat.get("collection", chat["id"])
+
+
+class ChatStore:
+    """The Streamlit app's chats (title, documents, directory, messages), saved next to the collections.
+
+    Chats name the collections they search, so loading them at startup keeps every
+    collection reachable after a page refresh or a restart. The file is rewritten
+    atomically on every save; the newest chat comes first.
+    """
+
+    def __init__(self, path=CHATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f).get("chats", [])
+
+    def _write(self, chats):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"chats": chats}, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        with self._lock:
+            return self._read()
+
+    def save(self, chat):
+        """Stores a new chat first, or replaces a saved one in place."""
+        with self._lock:
+            chats = self._read()
+            for i, saved in enumerate(chats):
+                if saved["id"] == chat["id"]:
+                    chats[i] = chat
+                    break
+            else:
+                chats.insert(0, chat)
+            self._write(chats)
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._write([chat for chat in self._read() if chat["id"] != chat_id])
+
+    def collections(self):
+        return {chat_collection(chat) for chat in self.load()}
+
+
+@hooks.cache_resource
+def load_chat_store():
+    return ChatStore()
@@ -0,0 +1,88 @@
+import os
+
+import httpx
+
+RAG_SERVICE_URL = os.getenv("RAG_SERVICE_URL")
+
+
+class ServiceClient:
+    """Talks to RAG.service so the UI does not need the index in its own process."""
+
+    def __init__(self, base_url=RAG_SERVICE_URL, timeout=600.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def stream_answer(self, question, model, collection=None):
+        with httpx.stream("POST", f"{self.base_url}/query",
+                          json={"question": question, "model": model, "stream": True,
+                                "collection": collection},
+                          timeout=self.timeout) as response:
+            response.raise_for_status()
+            yield from response.iter_text()
+
+    def query(self, question, model, collection=None):
+        response = httpx.post(f"{self.base_url}/query",
+                              json={"question": question, "model": model, "collection": collection},
+                              timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def ingest_directory(self, directory, collection=None):
+        response = httpx.post(f"{self.base_url}/ingest", 
+                              json={"directory": directory, "collection": collection},
+                              timeout=None)
+        response.raise_for_status()
+        return response.json()
+
+    def ingest_files(self, files, collection=None):
+        """files: list of (file name, bytes)."""
+        response = httpx.post(f"{self.base_url}/ingest/files",
+                              params={"collection": collection} if collection else None,
+                              files=[("files", (name, data)) for name, data in files],
+                              timeout=None)
+        response.raise_for_status()
+        return response.json()
+
+    def submit_job(self, directory, collection=None):
+        response = httpx.post(f"{self.base_url}/jobs", 
+                              json={"directory": directory, "collection": collection},
+                              timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def jobs(self, collection=None, limit=20):
+        params = {"limit": limit}
+        if collection is not None:
+            params["collection"] = collection
+        response = httpx.get(f"{self.base_url}/jobs", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel_job(self, job_id):
+        response = httpx.post(f"{self.base_url}/jobs/{job_id}/cancel", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def resume_job(self, job_id):
+        response = httpx.post(f"{self.base_url}/jobs/{job_id}/resume", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def delete_collection(self, collection):
+        response = httpx.delete(f"{self.base_url}/collections/{collection}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def metrics(self):
+        response = httpx.get(f"{self.base_url}/metrics", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def traces(self, limit=20):
+        response = httpx.get(f"{self.base_url}/traces", params={"limit": limit}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+def get_client():
+    return ServiceClient() if RAG_SERVICE_URL else None
@@ -1,28 +1,55 @@
-from docling.datamodel.base_models import InputFormat
-from docling.document_converter import ImageFormatOption, PdfFormatOption
-from docling.datamodel.pipeline_options import (
-    PdfPipelineOptions,
-    EasyOcrOptions 
-)
-from llama_index.core import SimpleDirectoryReader
 import os
-
-from llama_index.readers.docling import DoclingReader 
-import streamlit as st
+import glob
 
 from pathlib import Path
 import pikepdf
+import multiprocessing
+import hashlib
+import json
+import atexit
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from logger import logging
+from RAG import hooks
+from RAG.ingest_profiler import IngestProfiler, current_profiler, profile_stage, profiling_run
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+INGEST_QUEUE_FILES = int(os.getenv("INGEST_QUEUE_FILES", 2 * INGEST_WORKERS))  # conversions in flight
 
-@st.cache_resource
+@hooks.cache_resource
 def config_docling():
+    return build_file_extractor()
+
+def build_file_extractor():
+    from docling.datamodel.base_models import InputFormat
+    from docling.document_converter import ImageFormatOption, PdfFormatOption
+    from docling.datamodel.pipeline_options import (
+        PdfPipelineOptions,
+        EasyOcrOptions 
+    )
+    from llama_index.readers.docling import DoclingReader 
+    from RAG.docling_cache import cached_reader
+    from RAG.ocr_triage import AdaptiveOcrReader, accelerator_options, has_gpu
+    from RAG.fast_readers import (CsvRowGroupReader, EmailReader, FastPathReader, HtmlTextReader,
+                                  XlsxRowGroupReader, HTML_FAST_MAX_MB)
+
     #----------Docling Parser--------------
     ocr_options = EasyOcrOptions()
     ocr_options.lang = ["en"]
-    ocr_options.use_gpu = True
+    ocr_options.use_gpu = has_gpu()
+    # Only bitmap regions are OCR'd; text that has a text layer is taken from the PDF.
+    ocr_options.force_full_page_ocr = False
 
     ocr_pipeline_config = PdfPipelineOptions(
         do_ocr=True,
         ocr_options=ocr_options,
+        accelerator_options=accelerator_options(INGEST_WORKERS),
+        verbose=False
+    )
+    text_pipeline_config = PdfPipelineOptions(
+        do_ocr=False,
+        accelerator_options=accelerator_options(INGEST_WORKERS),
         verbose=False
     )
 
@@ -35,18 +62,39 @@ def config_docling():
             pipeline_options=ocr_pipeline_config
         )
     }
+    #-----Text Layer PDFs, without OCR--------------
+    text_format_options = {
+        InputFormat.PDF: PdfFormatOption(
+            pipeline_options=text_pipeline_config
+        )
+    }
 
-    docling_reader = DoclingReader(
-        format_options=docling_format_options
-    )
+    # Converted texts are cached by file hash, so repeated files skip conversion and OCR.
+    docling_reader = cached_reader(DoclingReader(format_options=docling_format_options),
+                                   options=docling_format_options)
+    text_reader = cached_reader(DoclingReader(format_options=text_format_options),
+                                options=text_format_options)
+    pdf_reader = AdaptiveOcrReader(text_reader, docling_reader)
+
+    #-----Fast Paths for Structured and Plain Formats--------------
+    # Tables are streamed into row groups whatever their size. HTML pages beyond
+    # HTML_FAST_MAX_MB are usually exported reports, where Docling's table structure pays off.
+    csv_reader = FastPathReader(CsvRowGroupReader(), docling_reader)
+    xlsx_reader = FastPathReader(XlsxRowGroupReader(), docling_reader)
+    html_reader = FastPathReader(HtmlTextReader(), docling_reader,
+                                 max_bytes=int(HTML_FAST_MAX_MB * 1024 * 1024))
+    email_reader = EmailReader()
 
     file_extractor_map = {
-        ".pdf": docling_reader,
+        ".pdf": pdf_reader,
         ".docx": docling_reader,
         ".pptx": docling_reader,
-        ".xlsx": docling_reader,
-        ".html": docling_reader,
-        ".csv": docling_reader,
+        ".xlsx": xlsx_reader,
+        ".html": html_reader,
+        ".htm": html_reader,
+        ".csv": csv_reader,
+        ".eml": email_reader,
+        ".msg": email_reader,
         
         # Image formats to be OCR'd by Docling
         ".png": docling_reader,
@@ -60,90 +108,454 @@ def config_docling():
 
 
 
+PDF_SCRATCH_DIR = os.path.join(os.getcwd(), "cache", "pdf_repair")
+PDF_REPAIR_LOG = os.path.join(PDF_SCRATCH_DIR, "repairs.json")
+
+def needs_mediabox_repair(pdf_path):
+    """True when at least one page has no explicit /MediaBox."""
+    with pikepdf.open(pdf_path) as pdf:
+        # Recent qpdf versions fill in a missing box while loading and only leave a warning.
+        if any("MediaBox" in warning for warning in pdf.get_warnings()):
+            return True
+        return any("/MediaBox" not in page.obj for page in pdf.pages)
+
 def enforce_mediabox_explicit(pdf_path, output_path, default_box=[0,0,595,842]):
-    """Ensures every page has an explicit /MediaBox defined (even if inherited)."""
-    pdf = pikepdf.open(pdf_path, allow_overwriting_input=True)
-    for page in pdf.pages:
-        box = None
+    """Writes a copy of pdf_path where every page has an explicit /MediaBox (even if inherited)."""
+    with pikepdf.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            if "/MediaBox" in page.obj:
+                continue
+            try:
+                box = list(page.mediabox)
+            except Exception:
+                box = default_box
+            page.obj["/MediaBox"] = pikepdf.Array(box)
+
+        tmp_path = f"{output_path}.tmp"
+        # A deterministic /ID makes the copy's bytes, and so its Docling cache key, depend only on the source.
+        pdf.save(tmp_path, deterministic_id=True)
+    os.replace(tmp_path, output_path)
+
+def _repair_prefix(pdf_path):
+    return hashlib.sha256(os.path.abspath(pdf_path).encode()).hexdigest()[:24]
+
+def repaired_pdf_path(pdf_path, scratch_dir=PDF_SCRATCH_DIR):
+    """<hash of the path>_<hash of size and mtime>.pdf: every copy made from one source shares a prefix."""
+    stat = os.stat(pdf_path)
+    version = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    return os.path.join(scratch_dir, f"{_repair_prefix(pdf_path)}_{version}.pdf")
+
+def remove_repaired_copies(pdf_path, scratch_dir=PDF_SCRATCH_DIR, keep=None):
+    """Deletes the repaired copies made from pdf_path, except keep."""
+    for path in glob.glob(os.path.join(scratch_dir, f"{_repair_prefix(pdf_path)}_*.pdf")):
+        if path != keep and os.path.exists(path):
+            os.remove(path)
+
+def prepare_pdf(pdf_path, scratch_dir=PDF_SCRATCH_DIR):
+    """Returns the path to parse: the original PDF, or a repaired copy in scratch_dir.
+
+    The source file is never modified. A repaired copy is reused until the source changes,
+    and replaces the copy made from the previous version of the source.
+    """
+    repaired_path = repaired_pdf_path(pdf_path, scratch_dir)
+    if os.path.exists(repaired_path):
+        return repaired_path
+    try:
+        if not needs_mediabox_repair(pdf_path):
+            return pdf_path
+        os.makedirs(scratch_dir, exist_ok=True)
+        enforce_mediabox_explicit(pdf_path, repaired_path)
+    except Exception as e:
+        print(f"❌ Failed on {pdf_path}: {e}")
+        return pdf_path
+    remove_repaired_copies(pdf_path, scratch_dir, keep=repaired_path)
+    print(f"✅ Rewritten MediaBoxes in: {pdf_path} -> {repaired_path}")
+    return repaired_path
+
+def pdf_page_count(pdf_path):
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return None
+
+def record_repairs(repairs, log_path=PDF_REPAIR_LOG):
+    """Adds {source: repaired copy} to the repair log. Zip members map to None: their copy
+    is deleted with the member's scratch file."""
+    if not repairs:
+        return
+    existing = {}
+    if os.path.exists(log_path):
+        with open(log_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+    existing.update(repairs)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(existing, f, indent=2)
+    logging.info(f"Repaired MediaBoxes in {len(repairs)} PDFs: {list(repairs)}")
+
+def prune_repairs(log_path=PDF_REPAIR_LOG):
+    """Deletes the repaired copies whose source PDF is gone, such as a deleted file or an
+    upload's temporary directory, and drops them from the repair log."""
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, "r", encoding="utf-8") as f:
+        existing = json.load(f)
+    gone = [source for source, copy in existing.items() if copy and not os.path.exists(source)]
+    if not gone:
+        return
+    for source in gone:
+        if os.path.exists(existing[source]):
+            os.remove(existing[source])
+        del existing[source]
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(existing, f, indent=2)
+    logging.info(f"Removed {len(gone)} repaired PDFs whose source is gone")
+
+def tag_source(documents, source_path):
+    """Records which file on disk produced each document, so it can be removed later.
+
+    Paths stay out of the embedded text: uploads land in a fresh temporary directory each
+    time, and the embedding cache is keyed by that text, so a re-upload, or the same passage
+    in another file, would never hit it.
+    """
+    for doc in documents:
+        doc.metadata["source_path"] = str(source_path)
+        for keys in (doc.excluded_embed_metadata_keys, doc.excluded_llm_metadata_keys):
+            if "source_path" not in keys:
+                keys.append("source_path")
+        if "file_path" not in doc.excluded_embed_metadata_keys:
+            doc.excluded_embed_metadata_keys.append("file_path")
+
+#-----------Parallel Conversion---------------------
+_worker_extractor = None
+
+def _init_worker():
+    """Builds one Docling converter per worker process; it stays warm for every file it converts."""
+    global _worker_extractor
+    _worker_extractor = build_file_extractor()
+
+def load_file(path, file_extractor_map, metadata=None):
+    """Parses a single file and returns (path, documents, repaired_pdf_path or None)."""
+    from llama_index.core import SimpleDirectoryReader
+    from llama_index.core.readers.file.base import default_file_metadata_func
+
+    path = str(path)
+    # Zip members are parsed from a scratch copy; profile them under their name in the archive.
+    profile_path = (metadata or {}).get("file_path", path)
+    parse_path = path
+    if path.lower().endswith(".pdf"):
+        # A PDF whose conversion is cached is not opened here: repair and page count would be wasted.
+        pdf_reader = file_extractor_map.get(".pdf")
+        is_cached = getattr(pdf_reader, "is_cached", lambda _: False)
+        with profile_stage("pdf_repair", profile_path) as counts:
+            if not is_cached(path):
+                parse_path = prepare_pdf(path)
+            if not is_cached(parse_path):
+                pages = pdf_page_count(parse_path)
+                if pages is not None:
+                    counts["pages"] = pages
+    reader = SimpleDirectoryReader(
+        input_files=[parse_path],
+        file_extractor=file_extractor_map,
+        file_metadata=lambda _: metadata or default_file_metadata_func(path),
+        # Failures propagate, so callers can skip the file and retry it later.
+        raise_on_error=True
+    )
+    with profile_stage("parse", profile_path) as counts:
         try:
-            box = page.obj.get("/MediaBox")
-            if box is None:
-                box = page.page_dict.get("/MediaBox")  # fallback
-        except Exception:
-            pass
-
-        if box is None:
-            page.obj["/MediaBox"] = pikepdf.Array(default_box)
-        else:
-            page.obj["/MediaBox"] = pikepdf.Array(list(box))
-
-    pdf.save(output_path)
-    print(f"✅ Rewritten MediaBoxes in: {output_path}")
-
-def fix_all_pdfs(root_dir):
-    for dirpath, _, filenames in os.walk(root_dir):
-        for file in filenames:
-            if file.lower().endswith(".pdf"):
-                input_path = os.path.join(dirpath, file)
-                output_path = os.path.join(dirpath, f"{os.path.splitext(file)[0]}.pdf")
+            documents = reader.load_data()
+        except Exception as e:
+            # SimpleDirectoryReader wraps the reader's error in a generic "Error loading file".
+            raise RuntimeError(str(e.__cause__ or e)) from e
+        counts["documents"] = len(documents)
+        counts["size_bytes"] = os.path.getsize(path)
+    return path, documents, (parse_path if parse_path != path else None)
+
+def _load_file(path, metadata=None):
+    """Runs in a worker; returns load_file's result and the worker's profile of the file."""
+    file_extractor_map, _ = _worker_extractor
+    profiler = IngestProfiler()
+    with profiler.active():
+        result = load_file(path, file_extractor_map, metadata=metadata)
+    return result, profiler.files
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_conversion_pool(workers=INGEST_WORKERS):
+    """The process pool of warm conversion workers, created on first use and shared by later calls.
+
+    Each worker builds its Docling converters once, so later uploads and syncs skip the start-up.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker)
+        return _pool
+
+def shutdown_conversion_pool(pool=None):
+    """Stops the workers; with pool, only if it is still the current one (e.g. after it broke)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or (pool is not None and pool is not _pool):
+            return
+        _pool, old = None, _pool
+    old.shutdown(wait=False, cancel_futures=True)
+
+atexit.register(shutdown_conversion_pool)
+
+def iter_load_files(paths, workers=INGEST_WORKERS, max_pending=INGEST_QUEUE_FILES, metadata=None):
+    """Converts files across the warm process pool and yields (path, documents, repaired) in completion order.
+
+    At most max_pending files are submitted at a time, so converted documents never pile
+    up faster than the caller consumes them. paths may be a lazy iterator; it is only
+    advanced when a slot frees up. `metadata` optionally maps a path to its file metadata.
+    """
+    total = len(paths) if hasattr(paths, "__len__") else "?"
+    remaining = iter(paths)
+    pool = get_conversion_pool(workers)
+    futures = {}
+
+    def submit():
+        for path in remaining:
+            file_metadata = metadata.get(str(path)) if metadata is not None else None
+            futures[pool.submit(_load_file, str(path), file_metadata)] = (path, file_metadata)
+            if len(futures) >= max(max_pending, workers):
+                return
+
+    try:
+        submit()
+        done = 0
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, file_metadata = futures.pop(future)
+                name = (file_metadata or {}).get("file_path", path)
+                done += 1
+                submit()
                 try:
-                    enforce_mediabox_explicit(input_path, output_path)
+                    result, profiled_files = future.result()
+                except BrokenProcessPool:
+                    raise
                 except Exception as e:
-                    print(f"❌ Failed on {input_path}: {e}")
+                    logging.error(f"Failed to convert {name}: {e}")
+                    print(f"❌ Failed on {name}: {e}")
+                    continue
+                if current_profiler() is not None:
+                    current_profiler().merge_files(profiled_files)
+                print(f"  Converted [{done}/{total}]: {name}")
+                yield result
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); the next call starts a fresh pool.
+        shutdown_conversion_pool(pool)
+        raise
+    finally:
+        # The caller stopped early, e.g. a cancelled job; the shared pool must not keep converting.
+        for future in futures:
+            future.cancel()
+
+def iter_load_files_here(paths, file_extractor_map, metadata=None):
+    """iter_load_files in this process: same results, and failed files are skipped the same way."""
+    for path in paths:
+        file_metadata = metadata.get(str(path)) if metadata is not None else None
+        try:
+            yield load_file(path, file_extractor_map, metadata=file_metadata)
+        except Exception as e:
+            name = (file_metadata or {}).get("file_path", path)
+            logging.error(f"Failed to convert {name}: {e}")
+            print(f"❌ Failed on {name}: {e}")
+
+def iter_documents(file_extractor_map, input_dir=None, input_files=None, exclude=None, workers=INGEST_WORKERS):
+    """Yields the documents of each file as soon as it is converted."""
+    from llama_index.core import SimpleDirectoryReader
+
+    reader = SimpleDirectoryReader(
+        input_dir=input_dir,
+        input_files=input_files,
+        file_extractor=file_extractor_map,
+        exclude=exclude,  
+        recursive=True
+    )
+    if workers <= 1 or len(reader.input_files) <= 1:
+        results = iter_load_files_here(reader.input_files, file_extractor_map)
+    else:
+        results = iter_load_files(reader.input_files, workers=workers)
+
+    for path, file_documents, repaired_path in results:
+        if repaired_path:
+            record_repairs({path: repaired_path})
+        yield file_documents
+
+def load_documents(file_extractor_map, input_dir=None, input_files=None, exclude=None, workers=INGEST_WORKERS):
+    return [doc for file_documents in iter_documents(file_extractor_map, input_dir, input_files, exclude, workers)
+            for doc in file_documents]
 
+#-----------Zip Archives---------------------
+import shutil
 import tempfile
+import uuid
 import zipfile
-def process_pipeline(input_dir):
-    file_extractor_map, exclude_extensions = config_docling()
-    fix_all_pdfs(input_dir)
+import mimetypes
+from datetime import datetime
+
+ZIP_SCRATCH_DIR = os.path.join(os.getcwd(), "cache", "zip_members")
+ZIP_SPOOL_MAX_BYTES = int(os.getenv("ZIP_SPOOL_MAX_BYTES", 64 * 1024 * 1024))
 
-    base_input_path = Path(input_dir).resolve()
-    all_documents = []
+def _skip_member(info):
+    parts = info.filename.split("/")
+    return info.is_dir() or "__MACOSX" in parts or any(p.startswith(".") for p in parts)
 
-    with tempfile.TemporaryDirectory() as temp_root:
-        print(f"Created temporary root: {temp_root}")
-        temp_root_path = Path(temp_root).resolve()
+def _member_metadata(zip_path, key, info):
+    file_path = f"{zip_path}/{key}"
+    return {
+        "file_path": file_path,
+        "file_name": os.path.basename(key),
+        "file_type": mimetypes.guess_type(key)[0],
+        "file_size": info.file_size,
+        "last_modified_date": datetime(*info.date_time).strftime("%Y-%m-%d"),
+    }
 
-        extracted_at_least_one_file = False
+def iter_zip_members(zip_file, prefix=""):
+    """Yields (key, info, zip_file) for every file in the archive, descending into nested zips.
 
-        for zip_path in Path(input_dir).rglob("*.zip"):
-            absolute_zip_parent = zip_path.parent.resolve()
-            relative_parent_dir = absolute_zip_parent.relative_to(base_input_path)
-            target_extract_dir = temp_root_path / relative_parent_dir / f"_temp_extract_{zip_path.stem}"
-            target_extract_dir.mkdir(parents=True, exist_ok=True)
+    A nested zip is spooled (in memory up to ZIP_SPOOL_MAX_BYTES, then on disk) because
+    ZipFile needs a seekable file; nothing else is extracted.
+    """
+    for info in zip_file.infolist():
+        if _skip_member(info):
+            continue
+        key = f"{prefix}{info.filename}"
+        if not info.filename.lower().endswith(".zip"):
+            yield key, info, zip_file
+            continue
+        with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_BYTES) as spool:
+            with zip_file.open(info) as member:
+                shutil.copyfileobj(member, spool)
+            spool.seek(0)
+            try:
+                with zipfile.ZipFile(spool) as nested:
+                    yield from iter_zip_members(nested, prefix=f"{key}/")
+            except zipfile.BadZipFile as e:
+                print(f"❌ Failed on {key}: {e}")
 
-            print(f"  Extracting: {zip_path} -> {target_extract_dir}")
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(target_extract_dir)
-            
-            extracted_at_least_one_file = True
-        
-        if extracted_at_least_one_file:
-            print("Loading documents from extracted zip contents...")
-            zip_content_reader = SimpleDirectoryReader(
-                input_dir=str(temp_root_path),
-                file_extractor=file_extractor_map,
-                recursive=True
-            )
-            zip_documents = zip_content_reader.load_data(show_progress=True)
-            for doc in zip_documents:
-                temp_file_path = Path(doc.metadata["file_path"]).resolve()
-                relative_doc_path = temp_file_path.relative_to(temp_root_path)
-                correct_path = base_input_path / relative_doc_path
-                doc.metadata["file_path"] = str(correct_path)
-                doc.metadata["file_name"] = correct_path.name
-                
-            all_documents.extend(zip_documents)
+def remove_scratch_file(scratch_path):
+    """Deletes a scratch copy together with the repaired PDF made from it, which is never reused."""
+    if not os.path.exists(scratch_path):
+        return
+    if scratch_path.lower().endswith(".pdf"):
+        remove_repaired_copies(scratch_path)
+    os.remove(scratch_path)
+
+def iter_zip_documents(zip_path, file_extractor_map, members=None, scratch_dir=ZIP_SCRATCH_DIR,
+                       workers=INGEST_WORKERS):
+    """Parses a zip archive's members and yields (key, documents) per parsed member.
+
+    Members are extracted to scratch files only as conversion slots free up, and converted
+    in the warm process pool like any other file (in this process when workers <= 1). A
+    scratch file is deleted as soon as its member is parsed, so at most
+    max(INGEST_QUEUE_FILES, workers) members (one when workers <= 1) are on disk at once:
+    scratch space is bounded by that many of the largest members, not by the archive.
+    `members` maps member keys to {"crc", "size", "doc_ids"} from the previous run. Members whose
+    CRC and size did not change are skipped; the dict is updated in place to describe the archive
+    as it is now, so it can be stored back in the manifest. A member that fails to parse is
+    stored as {"failed": True}, so the archive is synced again and the member retried.
+    """
+    zip_path = os.path.abspath(zip_path)
+    members = {} if members is None else members
+    previous = dict(members)
+    members.clear()
+    os.makedirs(scratch_dir, exist_ok=True)
+    extracted = {}  # scratch path -> (key, info, metadata)
+    metadata_by_path = {}
+
+    def extract(archive):
+        for key, info, owner in iter_zip_members(archive):
+            old = previous.get(key)
+            if old and old.get("crc") == info.CRC and old.get("size") == info.file_size:
+                members[key] = old
+                continue
+
+            scratch_path = os.path.join(scratch_dir, f"{uuid.uuid4().hex}{Path(key).suffix}")
+            metadata = _member_metadata(zip_path, key, info)
+            members[key] = {"failed": True}
+            try:
+                with profile_stage("zip_extract", metadata["file_path"]):
+                    with owner.open(info) as src, open(scratch_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+            except Exception as e:
+                print(f"❌ Failed on {zip_path}/{key}: {e}")
+                remove_scratch_file(scratch_path)
+                continue
+            extracted[scratch_path] = (key, info, metadata)
+            metadata_by_path[scratch_path] = metadata
+            yield scratch_path
+
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            if workers <= 1:
+                results = iter_load_files_here(extract(archive), file_extractor_map, metadata=metadata_by_path)
+            else:
+                results = iter_load_files(extract(archive), workers=workers, metadata=metadata_by_path)
+            for scratch_path, documents, repaired_path in results:
+                key, info, metadata = extracted[scratch_path]
+                remove_scratch_file(scratch_path)
+                if repaired_path:
+                    record_repairs({metadata["file_path"]: None})
+                tag_source(documents, zip_path)
+                members[key] = {"crc": info.CRC, "size": info.file_size,
+                                "doc_ids": [doc.id_ for doc in documents]}
+                print(f"  Parsed zip member: {zip_path}/{key}")
+                yield key, documents
+    finally:
+        for scratch_path in extracted:
+            remove_scratch_file(scratch_path)
+
+def process_pipeline(input_dir, input_files=None, workers=INGEST_WORKERS, zip_members=None):
+    """Loads documents from input_dir, or only from input_files (absolute paths under input_dir).
+
+    `zip_members` optionally maps zip paths to their member table from the manifest, so
+    unchanged members of a modified archive are not parsed again.
+    """
+    with profiling_run("parse"):
+        return list(iter_pipeline(input_dir, input_files, workers, zip_members))
+
+def iter_pipeline(input_dir, input_files=None, workers=INGEST_WORKERS, zip_members=None):
+    """Yields the documents process_pipeline would return, file by file as they are parsed.
+
+    Only the files being converted are held in memory, so passing this straight to
+    indexing.create_or_update_retriever keeps ingestion memory flat. `zip_members` is
+    complete once the generator is exhausted.
+    """
+    file_extractor_map, exclude_extensions = config_docling()
+    # Earlier uploads' temporary directories are gone by now.
+    prune_repairs()
+    if input_files is None:
+        zip_paths = list(Path(input_dir).rglob("*.zip"))
+    else:
+        zip_paths = [Path(f) for f in input_files if f.lower().endswith(".zip")]
+        input_files = [f for f in input_files if not f.lower().endswith(".zip")]
+
+    zip_members = {} if zip_members is None else zip_members
+
+    for zip_path in zip_paths:
+        zip_path = os.path.abspath(zip_path)
+        members = zip_members.setdefault(zip_path, {})
+        print(f"  Streaming: {zip_path}")
+        for _, documents in iter_zip_documents(zip_path, file_extractor_map, members, workers=workers):
+            yield from documents
 
     #-----------Non-zip Documents---------------------
-    print(f"Loading non-zip files from main directory: {input_dir}")
-    main_reader = SimpleDirectoryReader(
-        input_dir=input_dir,
-        file_extractor=file_extractor_map,
-        exclude=exclude_extensions,  
-        recursive=True
-    )
-    main_documents = main_reader.load_data(show_progress=True)
-    all_documents.extend(main_documents)
-    return all_documents
+    if input_files == []:
+        return
 
+    print(f"Loading non-zip files from main directory: {input_dir}")
+    for file_documents in iter_documents(file_extractor_map,
+                                         input_dir=input_dir if input_files is None else None,
+                                         input_files=input_files,
+                                         exclude=exclude_extensions,
+                                         workers=workers):
+        for doc in file_documents:
+            tag_source([doc], os.path.abspath(doc.metadata["file_path"]))
+        yield from file_documents
@@ -0,0 +1,173 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+import uuid
+from functools import lru_cache
+from importlib import metadata
+from typing import List
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+from logger import logging
+from RAG.manifest import file_sha256
+
+DOCLING_CACHE_DIR = os.getenv("DOCLING_CACHE_DIR", os.path.join(os.getcwd(), "cache", "docling"))
+DOCLING_CACHE_MAX_MB = float(os.getenv("DOCLING_CACHE_MAX_MB", 2048))
+DOCLING_CACHE_ENABLED = os.getenv("DOCLING_CACHE", "1") != "0"
+
+
+@lru_cache(maxsize=256)
+def _file_sha256(path, size, mtime_ns):
+    return file_sha256(path)
+
+
+def cached_file_sha256(path):
+    """file_sha256, computed once per version of the file although several readers look it up."""
+    stat = os.stat(path)
+    return _file_sha256(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _plain(value):
+    """JSON-friendly form of Docling's option models, enums and pipeline classes."""
+    if hasattr(value, "model_fields"):
+        return {"type": type(value).__name__,
+                **{name: getattr(value, name) for name in type(value).model_fields}}
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    text = str(value)
+    # Default reprs contain the object's address, which changes in every process.
+    return type(value).__qualname__ if " at 0x" in text else text
+
+
+def options_fingerprint(*options):
+    """Hash of the conversion options and the Docling version; part of every cache key."""
+    try:
+        version = metadata.version("docling")
+    except metadata.PackageNotFoundError:
+        version = None
+    payload = json.dumps([version, *options], default=_plain, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class DoclingCache:
+    """Converted texts keyed by SHA-256 of the file bytes plus the options fingerprint.
+
+    One gzipped JSON file per entry, written atomically, so conversion worker processes
+    can share the directory. Hits refresh the file's mtime; prune() drops the least
+    recently used entries beyond max_mb.
+    """
+
+    def __init__(self, cache_dir=DOCLING_CACHE_DIR, max_mb=DOCLING_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def contains(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                texts = json.load(f)["texts"]
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path)
+        return texts
+
+    def put(self, key, texts):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Threads of one process (a job and an upload) may convert the same file at once.
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"texts": texts}, f)
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            logging.info(f"Pruned {removed} Docling cache entries")
+
+
+class CachedDoclingReader(BaseReader):
+    """Wraps a DoclingReader and serves repeated files from the DoclingCache.
+
+    Keys use the same SHA-256 of the file bytes as StreamlitApp.get_file_hash, so a file
+    uploaded to another chat, or extracted again from a zip, skips conversion and OCR.
+    """
+
+    def __init__(self, reader, options=None, cache=None):
+        self.reader = reader
+        self.cache = cache or DoclingCache()
+        self.fingerprint = options_fingerprint(options, getattr(reader, "export_type", None),
+                                               getattr(reader, "md_export_kwargs", None))
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, file_path):
+        return f"{cached_file_sha256(file_path)}-{self.fingerprint}"
+
+    def is_cached(self, file_path):
+        return self.cache.contains(self.key_for(file_path))
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        key = self.key_for(file_path)
+        texts = self.cache.get(key)
+        if texts is not None:
+            self.hits += 1
+            logging.info(f"Docling cache hit for {file_path}")
+            return [Document(text=text, metadata=dict(extra_info or {})) for text in texts]
+
+        self.misses += 1
+        documents = self.reader.load_data(file_path, extra_info=extra_info, **load_kwargs)
+        try:
+            self.cache.put(key, [doc.text for doc in documents])
+        except OSError as e:
+            logging.warning(f"Could not cache Docling output for {file_path}: {e}")
+        return documents
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_docling_cache():
+    """The process's DoclingCache, pruned once when it is first used."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DoclingCache()
+            _cache.prune()
+        return _cache
+
+
+def cached_reader(reader, options=None):
+    """The reader behind the Docling cache, or the reader itself when DOCLING_CACHE=0."""
+    if not DOCLING_CACHE_ENABLED:
+        return reader
+    return CachedDoclingReader(reader, options=options, cache=get_docling_cache())
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from typing import Any, List
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from logger import logging
+
+CACHE_DIR = os.path.join(os.getcwd(), "cache")
+EMBED_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 500_000))
+
+
+def normalize_text(text):
+    """Collapses whitespace so formatting-only differences share one cache entry."""
+    return " ".join(text.split())
+
+
+def _pack(embedding):
+    return array("f", embedding).tobytes()
+
+
+def _unpack(blob):
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCacheStore:
+    """SQLite table of embeddings keyed by (model name, text hash) with LRU eviction."""
+
+    def __init__(self, path=EMBED_CACHE_PATH, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " embedding BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update({key: _unpack(blob) for key, blob in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                [(key, _pack(embedding), now) for key, embedding in items]
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            logging.info(f"Evicted {overflow} entries from embedding cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embed model and serves repeated texts from an EmbeddingCacheStore."""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingCacheStore = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(self, inner, store=None, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs
+        )
+        self._inner = inner
+        self._store = store if store is not None else EmbeddingCacheStore()
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    def _key(self, text, kind):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def stats(self):
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0,
+            "entries": len(self._store),
+        }
+
+    def _lookup(self, texts, kind):
+        keys = [self._key(text, kind) for text in texts]
+        cached = self._store.get_many(list(set(keys)))
+        missing = []
+        pending = set()
+        for i, key in enumerate(keys):
+            if key not in cached and key not in pending:
+                missing.append(i)
+                pending.add(key)
+        self._hits += len(texts) - len(missing)
+        self._misses += len(missing)
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, new_embeddings):
+        self._store.put_many([(keys[i], emb) for i, emb in zip(missing, new_embeddings)])
+        cached.update({keys[i]: emb for i, emb in zip(missing, new_embeddings)})
+        return [cached[key] for key in keys]
+
+    def _embed_texts(self, texts, kind, embed_fn):
+        keys, cached, missing = self._lookup(texts, kind)
+        new_embeddings = embed_fn([texts[i] for i in missing]) if missing else []
+        return self._merge(keys, cached, missing, new_embeddings)
+
+    async def _aembed_texts(self, texts, kind, embed_fn):
+        keys, cached, missing = self._lookup(texts, kind)
+        new_embeddings = await embed_fn([texts[i] for i in missing]) if missing else []
+        return self._merge(keys, cached, missing, new_embeddings)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_texts(
+            [query], "query", lambda q: [self._inner.get_query_embedding(q[0])]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def embed(q):
+            return [await self._inner.aget_query_embedding(q[0])]
+        return (await self._aembed_texts([query], "query", embed))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_texts(texts, "text", self._inner.get_text_embedding_batch)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed_texts(texts, "text", self._inner.aget_text_embedding_batch)
@@ -3,21 +3,31 @@ from dotenv import load_dotenv
 import sys
 from exception import customexception
 from logger import logging
-
-import streamlit as st
+from RAG import hooks
 
 load_dotenv()
 
 LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
 
-@st.cache_resource
-def load_embed_model(model_name="mxbai-embed-large:latest"):
+@hooks.cache_resource
+def load_embed_model(model_name="mxbai-embed-large:latest", use_cache=True):
     try:
+        from RAG.embed_cache import CachedEmbedding
+        from RAG.embedding_pipeline import EMBED_BATCH_SIZE
+        if model_name == "offline":
+            from RAG.offline_models import HashEmbedding
+            embed_model = HashEmbedding(embed_batch_size=EMBED_BATCH_SIZE)
+            return CachedEmbedding(embed_model) if use_cache else embed_model
+
         from llama_index.embeddings.ollama import OllamaEmbedding 
         if model_name == "mxbai-embed-large:latest":
-            embed_model = OllamaEmbedding(model_name="mxbai-embed-large:latest")
+            embed_model = OllamaEmbedding(model_name="mxbai-embed-large:latest",
+                                          embed_batch_size=EMBED_BATCH_SIZE)
         else:
-            embed_model = OllamaEmbedding(model_name="qwen3-embedding:0.6b")
-        return embed_model
+            embed_model = OllamaEmbedding(model_name="qwen3-embedding:0.6b",
+                                          embed_batch_size=EMBED_BATCH_SIZE)
+        if not use_cache:
+            return embed_model
+        return CachedEmbedding(embed_model)
     except Exception as e:
         raise customexception(e,sys)
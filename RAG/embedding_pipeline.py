@@ -0,0 +1,89 @@
+import os
+import asyncio
+import time
+
+from logger import logging
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", 4))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 3))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", 1.0))
+
+
+async def _embed_batch_with_retry(embed_model, texts, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            return await embed_model.aget_text_embedding_batch(texts)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            logging.warning(f"Embedding batch of {len(texts)} failed ({e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def aembed_nodes(nodes,
+                       embed_model,
+                       batch_size=EMBED_BATCH_SIZE,
+                       max_concurrency=EMBED_MAX_CONCURRENCY,
+                       max_retries=EMBED_MAX_RETRIES,
+                       backoff=EMBED_RETRY_BACKOFF,
+                       show_progress=False):
+    """Embeds nodes in batches with at most `max_concurrency` requests in flight.
+
+    Batches are fed through a bounded queue, so batches are only prepared as fast as
+    the embedding server drains them. Embeddings are written onto the nodes in place.
+    """
+    from llama_index.core.schema import MetadataMode
+
+    pending = [node for node in nodes if node.embedding is None]
+    stats = {"nodes": len(pending), "batches": 0, "seconds": 0.0, "nodes_per_sec": 0.0}
+    if not pending:
+        return stats
+
+    start = time.perf_counter()
+    queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    done = 0
+
+    async def producer():
+        for i in range(0, len(pending), batch_size):
+            await queue.put(pending[i:i + batch_size])
+        for _ in range(max_concurrency):
+            await queue.put(None)
+
+    async def worker():
+        nonlocal done
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            embeddings = await _embed_batch_with_retry(embed_model, texts, max_retries, backoff)
+            for node, embedding in zip(batch, embeddings):
+                node.embedding = embedding
+            done += len(batch)
+            stats["batches"] += 1
+            if show_progress:
+                elapsed = time.perf_counter() - start
+                print(f"Embedded {done}/{len(pending)} nodes ({done / elapsed:.1f} nodes/sec)")
+
+    tasks = [asyncio.create_task(producer())]
+    tasks += [asyncio.create_task(worker()) for _ in range(max_concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["nodes_per_sec"] = len(pending) / stats["seconds"] if stats["seconds"] else 0.0
+    logging.info(
+        f"Embedded {len(pending)} nodes in {stats['batches']} batches "
+        f"in {stats['seconds']:.1f}s ({stats['nodes_per_sec']:.1f} nodes/sec)"
+    )
+    return stats
+
+
+def embed_nodes(nodes, embed_model, **kwargs):
+    return asyncio.run(aembed_nodes(nodes, embed_model, **kwargs))
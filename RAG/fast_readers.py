@@ -0,0 +1,203 @@
+import os
+import csv
+import email
+import itertools
+from email import policy
+from html.parser import HTMLParser
+from typing import List
+
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+from logger import logging
+
+# Native readers for structured and plain formats. They run in milliseconds, where
+# Docling starts a full converter per format; Docling remains the fallback.
+
+ROWS_PER_DOC = int(os.getenv("FAST_READER_ROWS_PER_DOC", 100))
+HTML_FAST_MAX_MB = float(os.getenv("HTML_FAST_MAX_MB", 5))
+SNIFF_BYTES = 64 * 1024
+
+
+def row_group_documents(header, rows, extra_info, label=""):
+    """One document per ROWS_PER_DOC rows, each row written as "column: value" pairs."""
+    documents = []
+    prefix = f"{label}\n" if label else ""
+    for start in itertools.count(0, ROWS_PER_DOC):
+        group = list(itertools.islice(rows, ROWS_PER_DOC))
+        if not group:
+            break
+        lines = [" | ".join(f"{name}: {value}" for name, value in zip(header, row) if value not in ("", None))
+                 for row in group]
+        metadata = dict(extra_info or {})
+        metadata["rows"] = f"{start + 1}-{start + len(group)}"
+        documents.append(Document(text=prefix + "\n".join(line for line in lines if line), metadata=metadata))
+    return documents
+
+
+class CsvRowGroupReader(BaseReader):
+    """Streams a CSV file into documents of ROWS_PER_DOC rows, repeating the header in each."""
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+            sample = f.read(SNIFF_BYTES)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+            rows = csv.reader(f, dialect)
+            header = next(rows, None)
+            if header is None:
+                return []
+            header = [name.strip() or f"column_{i + 1}" for i, name in enumerate(header)]
+            return row_group_documents(header, rows, extra_info)
+
+
+class XlsxRowGroupReader(BaseReader):
+    """Streams every sheet of a workbook into row-group documents with openpyxl's read-only mode."""
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            documents = []
+            for sheet in workbook.worksheets:
+                rows = ([("" if v is None else str(v)) for v in row]
+                        for row in sheet.iter_rows(values_only=True) if any(v is not None for v in row))
+                header = next(rows, None)
+                if header is None:
+                    continue
+                header = [name.strip() or f"column_{i + 1}" for i, name in enumerate(header)]
+                sheet_docs = row_group_documents(header, rows, extra_info, label=f"Sheet: {sheet.title}")
+                for doc in sheet_docs:
+                    doc.metadata["sheet"] = sheet.title
+                documents.extend(sheet_docs)
+            return documents
+        finally:
+            workbook.close()
+
+
+#----------HTML--------------
+class _TextExtractor(HTMLParser):
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table",
+                  "section", "article", "header", "footer", "blockquote", "pre", "title", "dt", "dd"}
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+    def text(self):
+        lines = (" ".join(line.split()).strip(" |") for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+def html_to_text(html):
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+class HtmlTextReader(BaseReader):
+    """Visible text of an HTML page; table cells are separated by " | "."""
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            text = html_to_text(f.read())
+        return [Document(text=text, metadata=dict(extra_info or {}))] if text else []
+
+
+#----------Email--------------
+def email_text(subject, sender, to, date, body, attachments):
+    headers = [f"Subject: {subject}", f"From: {sender}", f"To: {to}", f"Date: {date}"]
+    if attachments:
+        headers.append(f"Attachments: {', '.join(attachments)}")
+    return "\n".join(headers) + "\n\n" + (body or "").strip()
+
+
+class EmailReader(BaseReader):
+    """Headers, body and attachment names of .eml files, and of Outlook .msg files if extract_msg is installed."""
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        if str(file_path).lower().endswith(".msg"):
+            text = self._msg_text(file_path)
+        else:
+            text = self._eml_text(file_path)
+        return [Document(text=text, metadata=dict(extra_info or {}))] if text else []
+
+    @staticmethod
+    def _eml_text(file_path):
+        with open(file_path, "rb") as f:
+            message = email.message_from_binary_file(f, policy=policy.default)
+        part = message.get_body(preferencelist=("plain", "html"))
+        body = ""
+        if part is not None:
+            body = part.get_content()
+            if part.get_content_type() == "text/html":
+                body = html_to_text(body)
+        attachments = [a.get_filename() for a in message.iter_attachments() if a.get_filename()]
+        return email_text(message["subject"], message["from"], message["to"], message["date"], body, attachments)
+
+    @staticmethod
+    def _msg_text(file_path):
+        try:
+            import extract_msg
+        except ImportError:
+            logging.warning(f"Skipping {file_path}: reading .msg files needs `pip install extract-msg`")
+            return ""
+        message = extract_msg.openMsg(str(file_path))
+        try:
+            body = message.body or (html_to_text(message.htmlBody.decode("utf-8", "replace"))
+                                    if message.htmlBody else "")
+            attachments = [a.longFilename or a.shortFilename for a in message.attachments]
+            return email_text(message.subject, message.sender, message.to, message.date, body,
+                              [name for name in attachments if name])
+        finally:
+            message.close()
+
+
+#----------Fallback--------------
+class FastPathReader(BaseReader):
+    """Reads a file with a fast reader and falls back to Docling when that is not a good fit.
+
+    Docling takes over for files larger than max_bytes (None means no limit), and when the
+    fast reader fails or finds no text.
+    """
+
+    def __init__(self, fast_reader, fallback_reader, max_bytes=None):
+        self.fast_reader = fast_reader
+        self.fallback_reader = fallback_reader
+        self.max_bytes = max_bytes
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        if self.max_bytes is None or os.path.getsize(file_path) <= self.max_bytes:
+            try:
+                documents = self.fast_reader.load_data(file_path, extra_info=extra_info)
+                if documents:
+                    return documents
+                logging.info(f"{type(self.fast_reader).__name__} found no text in {file_path}, using Docling")
+            except Exception as e:
+                logging.warning(f"{type(self.fast_reader).__name__} failed on {file_path}, using Docling: {e}")
+        return self.fallback_reader.load_data(file_path, extra_info=extra_info, **load_kwargs)
@@ -0,0 +1,198 @@
+import os
+import json
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from logger import logging
+
+# M: graph degree. Higher improves recall at the cost of memory and insert time.
+# ef_construction: build-time beam width. ef_search: query-time beam width, the main
+# recall/latency knob; it is raised to top_k when smaller.
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+HNSW_INITIAL_CAPACITY = int(os.getenv("HNSW_INITIAL_CAPACITY", 10000))
+
+INDEX_FILE = "hnsw_index.bin"
+META_FILE = "hnsw_meta.json"
+
+
+class HnswVectorStore(BasePydanticVectorStore):
+    """Approximate nearest neighbor vector store backed by an hnswlib graph.
+
+    Only embeddings live here; node text stays in the index docstore. Deletes are
+    tombstones in the graph (hnswlib's mark_deleted), and hnswlib reuses their slots
+    for later inserts. Labels are never reused, so a tombstone can not shadow a live node. The graph and the id tables are persisted next to the docstore.
+    """
+
+    stores_text: bool = False
+    space: str = Field(default="cosine")
+    m: int = Field(default=HNSW_M)
+    ef_construction: int = Field(default=HNSW_EF_CONSTRUCTION)
+    ef_search: int = Field(default=HNSW_EF_SEARCH)
+    dim: Optional[int] = Field(default=None)
+
+    _index: Any = PrivateAttr(default=None)
+    _labels: dict = PrivateAttr(default_factory=dict)
+    _node_ids: dict = PrivateAttr(default_factory=dict)
+    _ref_docs: dict = PrivateAttr(default_factory=dict)
+    _next_label: int = PrivateAttr(default=0)
+    _lock = PrivateAttr(default_factory=threading.RLock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HnswVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._index
+
+    def __bool__(self):
+        # StorageContext.from_defaults tests `if vector_store:`; an empty store must not become a simple one.
+        return True
+
+    def __len__(self):
+        return len(self._labels)
+
+    @property
+    def nbytes(self):
+        """Approximate resident size: vectors, graph links and the id tables."""
+        if self._index is None:
+            return 0
+        return self._index.get_max_elements() * (self.dim * 4 + self.m * 2 * 4) + len(self) * 200
+
+    def _init_index(self, dim, capacity=HNSW_INITIAL_CAPACITY):
+        import hnswlib
+
+        self.dim = dim
+        self._index = hnswlib.Index(space=self.space, dim=dim)
+        self._index.init_index(max_elements=capacity, ef_construction=self.ef_construction,
+                               M=self.m, allow_replace_deleted=True)
+        self._index.set_ef(self.ef_search)
+
+    def _ensure_capacity(self, count):
+        capacity = self._index.get_max_elements()
+        needed = self._index.get_current_count() + count
+        if needed > capacity:
+            self._index.resize_index(max(needed, capacity * 2))
+
+    #----------Updates--------------
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        node_ids = [node.node_id for node in nodes]
+        self.add_embeddings(node_ids, [node.get_embedding() for node in nodes],
+                            [node.ref_doc_id for node in nodes])
+        return node_ids
+
+    def add_embeddings(self, node_ids, embeddings, ref_doc_ids):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self._index is None:
+                self._init_index(vectors.shape[1])
+            self.delete_nodes([node_id for node_id in node_ids if node_id in self._labels])
+
+            labels = []
+            for node_id, ref_doc_id in zip(node_ids, ref_doc_ids):
+                label = self._next_label
+                self._next_label += 1
+                labels.append(label)
+                self._labels[node_id] = label
+                self._node_ids[label] = node_id
+                self._ref_docs.setdefault(ref_doc_id, []).append(node_id)
+
+            self._ensure_capacity(len(labels))
+            self._index.add_items(vectors, np.asarray(labels, dtype=np.int64), replace_deleted=True)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            self.delete_nodes(self._ref_docs.pop(ref_doc_id, []))
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        if filters is not None:
+            raise NotImplementedError("HnswVectorStore does not support metadata filters")
+        with self._lock:
+            for node_id in node_ids or []:
+                label = self._labels.pop(node_id, None)
+                if label is None:
+                    continue
+                self._node_ids.pop(label, None)
+                self._index.mark_deleted(label)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._labels, self._node_ids, self._ref_docs = {}, {}, {}
+            self._next_label = 0
+
+    #----------Search--------------
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise NotImplementedError("HnswVectorStore does not support metadata filters")
+        with self._lock:
+            top_k = min(query.similarity_top_k, len(self._labels))
+            if top_k == 0 or query.query_embedding is None:
+                return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+            self._index.set_ef(max(self.ef_search, top_k))
+            labels, distances = self._index.knn_query(
+                np.asarray(query.query_embedding, dtype=np.float32), k=top_k
+            )
+            ids = [self._node_ids[int(label)] for label in labels[0]]
+        similarities = (1.0 - distances[0]).tolist() if self.space != "l2" else (-distances[0]).tolist()
+        return VectorStoreQueryResult(nodes=None, similarities=similarities, ids=ids)
+
+    #----------Persistence--------------
+    def persist(self, persist_path: str, fs=None) -> None:
+        """persist_path is the default vector store file name; files go into its directory."""
+        persist_dir = os.path.dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+        with self._lock:
+            if self._index is None:
+                return
+            tmp_index = os.path.join(persist_dir, INDEX_FILE + ".tmp")
+            self._index.save_index(tmp_index)
+            meta = {
+                "space": self.space, "m": self.m, "ef_construction": self.ef_construction,
+                "dim": self.dim, "next_label": self._next_label,
+                "labels": self._labels, "ref_docs": self._ref_docs,
+            }
+            tmp_meta = os.path.join(persist_dir, META_FILE + ".tmp")
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_index, os.path.join(persist_dir, INDEX_FILE))
+            os.replace(tmp_meta, os.path.join(persist_dir, META_FILE))
+
+    @classmethod
+    def exists(cls, persist_dir):
+        return os.path.exists(os.path.join(persist_dir, META_FILE))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, **kwargs):
+        """Loads the store persisted in persist_dir, or returns an empty one."""
+        if not cls.exists(persist_dir):
+            return cls(**kwargs)
+
+        import hnswlib
+
+        with open(os.path.join(persist_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(space=meta["space"], m=meta["m"], ef_construction=meta["ef_construction"],
+                    dim=meta["dim"], **kwargs)
+        store._index = hnswlib.Index(space=meta["space"], dim=meta["dim"])
+        store._index.load_index(os.path.join(persist_dir, INDEX_FILE), allow_replace_deleted=True)
+        store._index.set_ef(store.ef_search)
+        store._labels = meta["labels"]
+        store._node_ids = {label: node_id for node_id, label in meta["labels"].items()}
+        store._ref_docs = meta["ref_docs"]
+        store._next_label = meta["next_label"]
+        logging.info(f"Loaded HNSW index with {len(store)} vectors from {persist_dir}")
+        return store
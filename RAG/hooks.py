@@ -0,0 +1,157 @@
+import functools
+import threading
+from contextlib import contextmanager
+
+from logger import logging
+
+
+class IndexState(dict):
+    """Holds vector_index, bm25_index, fusion_retriever and model_llm.
+
+    It has the same get/attribute interface as st.session_state, so either can be passed
+    wherever the RAG package takes a state.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+#----------Caching--------------
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def memoize(func):
+    """Process-wide cache keyed on the call arguments, used when no other backend is set."""
+    results = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (_freeze(args), _freeze(kwargs))
+        with lock:
+            if key not in results:
+                results[key] = func(*args, **kwargs)
+            return results[key]
+
+    wrapper.clear = results.clear
+    return wrapper
+
+
+_cache_backend = memoize
+
+
+def set_cache_backend(decorator):
+    """Sets the decorator used by cache_resource, e.g. st.cache_resource.
+
+    Functions that were already called keep the backend they were first called with.
+    """
+    global _cache_backend
+    _cache_backend = decorator
+
+
+def cache_resource(func):
+    """Caches a model or client loader with the backend chosen at its first call."""
+    cached = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal cached
+        if cached is None:
+            cached = _cache_backend(func)
+        return cached(*args, **kwargs)
+
+    return wrapper
+
+
+#----------Progress--------------
+class LoggingProgress:
+    """Reports progress to the log file. Used by CLIs, workers and the service."""
+
+    @contextmanager
+    def spinner(self, message):
+        logging.info(message)
+        yield
+
+    def info(self, message):
+        logging.info(message)
+
+    def caption(self, message):
+        logging.info(message)
+
+    def warning(self, message):
+        logging.warning(message)
+
+
+class StreamlitProgress:
+    """Reports progress in the Streamlit page, or to the log file from background threads."""
+
+    _fallback = LoggingProgress()
+
+    @staticmethod
+    def _page():
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        return st if get_script_run_ctx() is not None else None
+
+    def spinner(self, message):
+        st = self._page()
+        return st.spinner(message) if st else self._fallback.spinner(message)
+
+    def info(self, message):
+        st = self._page()
+        if st is None:
+            return self._fallback.info(message)
+        st.info(message)
+
+    def caption(self, message):
+        st = self._page()
+        if st is None:
+            return self._fallback.caption(message)
+        st.caption(message)
+
+    def warning(self, message):
+        st = self._page()
+        if st is None:
+            return self._fallback.warning(message)
+        st.warning(message)
+
+
+progress = LoggingProgress()
+_default_state = IndexState()
+
+
+def set_progress(reporter):
+    global progress
+    progress = reporter
+
+
+def set_default_state(state):
+    """Sets the state used when a function is not given one explicitly."""
+    global _default_state
+    _default_state = state
+
+
+def get_state(state=None):
+    return _default_state if state is None else state
+
+
+def use_streamlit():
+    """Wires the RAG package to Streamlit's resource cache, page and session state."""
+    import streamlit as st
+
+    set_cache_backend(st.cache_resource)
+    set_progress(StreamlitProgress())
+    set_default_state(st.session_state)
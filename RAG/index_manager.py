@@ -0,0 +1,184 @@
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+import RAG.indexing as indexing
+from RAG import hooks
+from RAG.hooks import IndexState
+from logger import logging
+
+COLLECTIONS_DIR = os.path.join(indexing.PERSIST_DIR, "collections")
+INDEX_MEMORY_BUDGET_MB = float(os.getenv("INDEX_MEMORY_BUDGET_MB", 1024))
+
+# A float in a Python list costs a pointer plus a boxed float object.
+EMBEDDING_BYTES_PER_DIM = 32
+NODE_OVERHEAD_BYTES = 1024
+
+
+def collection_dir(collection_id, root=COLLECTIONS_DIR):
+    """Storage directory of a collection. None is the shared storage/ directory."""
+    if collection_id is None:
+        return indexing.PERSIST_DIR
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(collection_id))
+    return os.path.join(root, "_" * len(name) if name in (".", "..") else name)
+
+
+@contextmanager
+def storage_lock(persist_dir):
+    """Serializes writers of a collection's storage directory: threads, and processes sharing it.
+
+    Every writer opens the lock file itself, so flock also excludes threads of one process.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, ".ingest.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_ingest_state(collection_id, model_llm=None):
+    """A fresh, writable IndexState of the collection for one ingestion.
+
+    Call it while holding storage_lock(collection_dir(collection_id)), then put() the
+    state into the IndexManager so readers switch to it.
+    """
+    state = IndexState(collection_id=collection_id, persist_dir=collection_dir(collection_id),
+                       model_llm=model_llm, index_version=0)
+    indexing.load_persisted_index(state=state)
+    return state
+
+
+def estimate_index_bytes(state):
+    """Rough resident size of a loaded collection: embeddings, node text and metadata, BM25 tables."""
+    vector_index = state.get("vector_index")
+    if vector_index is None:
+        return 0
+
+    total = 0
+    for node in vector_index.docstore.docs.values():
+        total += NODE_OVERHEAD_BYTES + len(node.get_content())
+        total += sum(len(str(value)) for value in node.metadata.values())
+
+    vector_store = vector_index.vector_store
+    embedding_dict = getattr(getattr(vector_store, "data", None), "embedding_dict", None)
+    if hasattr(vector_store, "nbytes"):
+        total += vector_store.nbytes
+    elif embedding_dict:
+        dim = len(next(iter(embedding_dict.values())))
+        total += len(embedding_dict) * dim * EMBEDDING_BYTES_PER_DIM
+
+    bm25_index = state.get("bm25_index")
+    if bm25_index is not None:
+        total += len(bm25_index.node_ids) * 100 + len(bm25_index.vocab) * 80
+        # Segments are memory-mapped; only the pages that were touched are resident.
+        total += sum(np.asarray(s.term_ids).nbytes + np.asarray(s.offsets).nbytes
+                     for s in bm25_index.segments)
+    return total
+
+
+class IndexManager:
+    """Per-collection indexes with least-recently-used residency under a memory budget.
+
+    Every collection is persisted in its own directory. get() loads it on first use and
+    evicts the least recently used collections once the estimated size of everything
+    loaded exceeds the budget. Evicting only drops the in-memory objects, since every
+    update is already persisted.
+    """
+
+    def __init__(self, memory_budget_mb=INDEX_MEMORY_BUDGET_MB, root=COLLECTIONS_DIR):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.root = root
+        self._states = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, collection_id):
+        return collection_id in self._states
+
+    def resident_bytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, collection_id, model_llm=None):
+        """Returns the collection's IndexState, loading it from disk if it is not resident.
+
+        Also reloads it when another process persisted a newer version. States are
+        loaded read-only; ingestion builds its own state under storage_lock and put()s it.
+        """
+        persist_dir = collection_dir(collection_id, self.root)
+        with self._lock:
+            state = self._states.get(collection_id)
+            if state is not None and state.get("index_version", 0) != indexing.get_index_version(persist_dir):
+                logging.info(f"Collection {collection_id} changed on disk, reloading")
+                state = None
+
+            if state is None:
+                state = IndexState(collection_id=collection_id, persist_dir=persist_dir,
+                                   model_llm=model_llm, index_version=0)
+                indexing.load_persisted_index(state=state, read_only=True)
+                self._states[collection_id] = state
+                self.update_size(collection_id)
+            elif model_llm is not None and state.get("model_llm") is not model_llm:
+                state.model_llm = model_llm
+                indexing.refresh_retriever(state)
+
+            self._states.move_to_end(collection_id)
+            return state
+
+    def put(self, collection_id, state):
+        """Publishes a state built elsewhere, e.g. by an ingestion that must not disturb readers."""
+        with self._lock:
+            self._states[collection_id] = state
+            self._states.move_to_end(collection_id)
+            self.update_size(collection_id)
+
+    def update_size(self, collection_id):
+        """Re-estimates a collection after documents were added or removed, then evicts if needed."""
+        with self._lock:
+            state = self._states.get(collection_id)
+            if state is None:
+                return
+            self._sizes[collection_id] = estimate_index_bytes(state)
+            self._evict(keep=collection_id)
+
+    def _evict(self, keep):
+        while self.resident_bytes() > self.memory_budget and len(self._states) > 1:
+            collection_id = next(iter(self._states))
+            if collection_id == keep:
+                self._states.move_to_end(keep)
+                collection_id = next(iter(self._states))
+            self.evict(collection_id)
+
+    def evict(self, collection_id):
+        with self._lock:
+            self._states.pop(collection_id, None)
+            size = self._sizes.pop(collection_id, 0)
+        logging.info(f"Evicted collection {collection_id} ({size / 1e6:.1f} MB) from memory")
+
+    def delete(self, collection_id):
+        """Evicts a collection and removes its persisted index, sentence windows and cached answers."""
+        from RAG.sentence_windows import close_sentence_store
+
+        self.evict(collection_id)
+        if collection_id is not None:
+            persist_dir = collection_dir(collection_id, self.root)
+            close_sentence_store(persist_dir)
+            shutil.rmtree(persist_dir, ignore_errors=True)
+        import RAG.query_eng as qe
+        qe.load_answer_cache().drop_collection(collection_id or "")
+
+
+@hooks.cache_resource
+def load_index_manager():
+    return IndexManager()
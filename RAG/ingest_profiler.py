@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from logger import logging
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_DIR = os.getenv("INGEST_PROFILE_DIR", os.path.join(os.getcwd(), "logs", "ingest_profiles"))
+PROFILE_TOP_FILES = int(os.getenv("INGEST_PROFILE_TOP", 10))
+PROFILE_RSS_INTERVAL = float(os.getenv("INGEST_PROFILE_RSS_INTERVAL", 0.05))  # seconds between RSS samples
+
+_current_profiler = ContextVar("current_ingest_profiler", default=None)
+_open_file_stages = ContextVar("open_file_stages", default=())  # files with a stage open in this context
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory over its whole lifetime; it never goes down."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """This process's resident memory right now, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class RssSampler:
+    """Samples resident memory on a background thread while any window is open.
+
+    Each window keeps the RSS at its start and the highest sample seen until it is closed,
+    so a stage reports its own peak rather than the process's lifetime high-water mark.
+    """
+
+    def __init__(self, interval=PROFILE_RSS_INTERVAL):
+        self.interval = interval
+        self._windows = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def open(self):
+        rss = current_rss_mb()
+        window = {"start": rss, "peak": rss}
+        with self._lock:
+            self._windows.append(window)
+            if self._thread is None and rss is not None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        return window
+
+    def close(self, window):
+        self._sample()
+        with self._lock:
+            self._windows = [w for w in self._windows if w is not window]
+        return window
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self._lock:
+            for window in self._windows:
+                window["peak"] = max(window["peak"] or 0.0, rss)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._windows:
+                    self._thread = None
+                    return
+            self._sample()
+
+
+_rss_sampler = RssSampler()
+
+
+class IngestProfiler:
+    """Wall time, CPU time and resident memory per file and stage for one ingestion run.
+
+    Per-file stages (pdf_repair, zip_extract, parse) are measured in the process that
+    runs them, including the conversion workers, whose records are merged back here.
+    ocr_triage runs inside parse and also counts the PDF pages that skipped OCR; a file's
+    wall_s and cpu_s cover only its outermost stages, so nested ones are not counted twice.
+    Run-wide stages (sentence_parse, embed, index_update) cover the whole batch.
+    CPU time is the process's, so it includes other threads working at the same time.
+    rss_peak_mb is the highest RSS sampled during a stage and rss_growth_mb how far that
+    peak rose above the RSS at the stage's start (the maximum over repeated stages).
+    """
+
+    def __init__(self, name="ingest"):
+        self.name = name
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self.files = {}
+        self.stages = {}
+
+    def file(self, path):
+        return self.files.setdefault(str(path), {"stages": {}, "wall_s": 0.0, "cpu_s": 0.0})
+
+    @contextmanager
+    def stage(self, stage, path=None):
+        """Times the block; the yielded dict takes counts such as pages or nodes."""
+        counts = {}
+        outermost = path is not None and str(path) not in _open_file_stages.get()
+        token = _open_file_stages.set(_open_file_stages.get() + (str(path),)) if outermost else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        window = _rss_sampler.open()
+        try:
+            yield counts
+        finally:
+            _rss_sampler.close(window)
+            if token is not None:
+                _open_file_stages.reset(token)
+            timing = {"wall_s": time.perf_counter() - wall,
+                      "cpu_s": time.process_time() - cpu,
+                      "rss_peak_mb": window["peak"],
+                      "rss_growth_mb": (window["peak"] - window["start"]
+                                        if window["peak"] is not None else None)}
+            if path is None:
+                self._add(self.stages.setdefault(stage, {}), timing, counts)
+            else:
+                record = self.file(path)
+                self._add(record["stages"].setdefault(stage, {}), timing, {})
+                if outermost:
+                    record["wall_s"] += timing["wall_s"]
+                    record["cpu_s"] += timing["cpu_s"]
+                for key, value in counts.items():
+                    record[key] = record.get(key, 0) + value
+
+    @staticmethod
+    def _add(entry, timing, counts):
+        for key in ("wall_s", "cpu_s"):
+            entry[key] = entry.get(key, 0.0) + timing[key]
+        for key in ("rss_peak_mb", "rss_growth_mb"):
+            if timing.get(key) is not None:
+                entry[key] = max(entry.get(key, 0.0), timing[key])
+        for key, value in counts.items():
+            entry[key] = entry.get(key, 0) + value
+
+    def merge_files(self, files):
+        """Adds file records measured in another process."""
+        for path, other in files.items():
+            record = self.file(path)
+            for stage, timing in other["stages"].items():
+                self._add(record["stages"].setdefault(stage, {}), timing, {})
+            for key, value in other.items():
+                if key != "stages":
+                    record[key] = record.get(key, 0) + value
+
+    def count_nodes(self, nodes):
+        for node in nodes:
+            path = node.metadata.get("file_path")
+            if path:
+                record = self.file(path)
+                record["nodes"] = record.get("nodes", 0) + 1
+
+    @contextmanager
+    def active(self):
+        token = _current_profiler.set(self)
+        try:
+            yield self
+        finally:
+            _current_profiler.reset(token)
+
+    #----------Report--------------
+    def report(self):
+        files = [{"file": path, **record} for path, record in self.files.items()]
+        files.sort(key=lambda f: f["wall_s"], reverse=True)
+
+        stage_totals = {stage: dict(timing) for stage, timing in self.stages.items()}
+        for record in files:
+            for stage, timing in record["stages"].items():
+                self._add(stage_totals.setdefault(stage, {}), timing, {"files": 1})
+
+        skipped = sum(record.get("ocr_skipped_pages", 0) for record in files)
+        ocr_pages = sum(record.get("ocr_pages", 0) for record in files)
+        return {
+            "name": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_s": time.perf_counter() - self._start,
+            "stages": stage_totals,
+            "ocr": {"triaged_pages": skipped + ocr_pages, "skipped_pages": skipped},
+            "process_peak_rss_mb": peak_rss_mb(),
+            "files": files,
+        }
+
+    def write_report(self, profile_dir=PROFILE_DIR, top=PROFILE_TOP_FILES):
+        """Writes the JSON report and prints the stage totals and slowest files."""
+        report = self.report()
+        if not report["files"] and not report["stages"]:
+            return None
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{self.name}_{self.started.strftime('%m_%d_%Y_%H_%M_%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        lines = [f"Ingestion profile '{self.name}': {report['wall_s']:.1f}s, "
+                 f"{len(report['files'])} files -> {path}"]
+        for stage, timing in sorted(report["stages"].items(), key=lambda s: -s[1]["wall_s"]):
+            lines.append(f"  {stage:<15} wall {timing['wall_s']:8.1f}s  cpu {timing['cpu_s']:8.1f}s"
+                         f"  rss +{timing.get('rss_growth_mb', 0.0):7.1f} MB")
+        if report["ocr"]["triaged_pages"]:
+            lines.append(f"  OCR skipped on {report['ocr']['skipped_pages']} of "
+                         f"{report['ocr']['triaged_pages']} PDF pages (text layer, no large images)")
+        if report["files"]:
+            lines.append("  Slowest files:")
+            for record in report["files"][:top]:
+                slowest = max(record["stages"].items(), key=lambda s: s[1]["wall_s"])[0] if record["stages"] else "-"
+                lines.append(f"  {record['wall_s']:8.1f}s  {record.get('pages', '-'):>5} pages  "
+                             f"{record.get('nodes', 0):>6} nodes  [{slowest}]  {record['file']}")
+        summary = "\n".join(lines)
+        print(f"✅ {summary}")
+        logging.info(summary)
+        return path
+
+
+def current_profiler():
+    return _current_profiler.get()
+
+
+@contextmanager
+def profile_stage(stage, path=None):
+    """A stage of the active profiler, or a no-op when nothing is being profiled."""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield {}
+        return
+    with profiler.stage(stage, path) as counts:
+        yield counts
+
+
+@contextmanager
+def profiling_run(name="ingest"):
+    """Profiles the block and writes a report, unless an enclosing run already profiles it."""
+    profiler = _current_profiler.get()
+    if profiler is not None:
+        yield profiler
+        return
+    profiler = IngestProfiler(name)
+    with profiler.active():
+        try:
+            yield profiler
+        finally:
+            try:
+                profiler.write_report()
+            except OSError as e:
+                logging.warning(f"Could not write ingestion profile: {e}")
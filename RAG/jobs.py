@@ -0,0 +1,321 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import RAG.indexing as indexing
+import RAG.model_api as model_api
+from RAG import hooks
+from RAG.index_manager import collection_dir, load_ingest_state, storage_lock
+from logger import logging
+
+JOBS_DB_PATH = os.path.join(indexing.PERSIST_DIR, "jobs.sqlite")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_CHECKPOINT_FILES = int(os.getenv("JOB_CHECKPOINT_FILES", 10))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 10))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 120))
+JOB_MODEL = os.getenv("RAG_DEFAULT_MODEL", "qwen/qwen3-32b")  # builds the job's fusion retriever
+
+QUEUED, RUNNING, CANCELLING = "queued", "running", "cancelling"
+COMPLETED, CANCELLED, FAILED = "completed", "cancelled", "failed"
+ACTIVE = (QUEUED, RUNNING, CANCELLING)
+
+
+class JobStore:
+    """Ingestion jobs and the status of every file they touch, in SQLite.
+
+    Several processes (e.g. service workers) can share one store: jobs are claimed in a
+    transaction, and a running job whose owner stopped sending heartbeats is queued again.
+    """
+
+    def __init__(self, path=JOBS_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " collection TEXT NOT NULL DEFAULT '',"
+            " directory TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " owner TEXT,"
+            " heartbeat REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " summary TEXT,"
+            " error TEXT,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            " job_id TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " documents INTEGER NOT NULL DEFAULT 0,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (job_id, path))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created)")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, directory, collection=None):
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._execute("INSERT INTO jobs (id, collection, directory, status, created, updated) "
+                      "VALUES (?, ?, ?, ?, ?, ?)",
+                      (job_id, collection or "", os.path.abspath(directory), QUEUED, now, now))
+        return job_id
+
+    def claim(self, owner):
+        """Marks the oldest queued job as running, unless its collection is already being ingested."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs j WHERE status = ? AND NOT EXISTS ("
+                    " SELECT 1 FROM jobs r WHERE r.collection = j.collection AND r.status IN (?, ?))"
+                    " ORDER BY created LIMIT 1", (QUEUED, RUNNING, CANCELLING)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._conn.execute("UPDATE jobs SET status = ?, owner = ?, heartbeat = ?, "
+                                       "attempts = attempts + 1, updated = ? WHERE id = ?",
+                                       (RUNNING, owner, now, now, row["id"]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None if row is None else self.get(row["id"])
+
+    def heartbeat(self, job_ids):
+        now = time.time()
+        for job_id in job_ids:
+            self._execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (now, job_id))
+
+    def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS):
+        """Queues running jobs whose worker died so they resume from their last checkpoint."""
+        cutoff = time.time() - stale_seconds
+        rows = self._execute("SELECT id, status FROM jobs WHERE status IN (?, ?) AND heartbeat < ?",
+                             (RUNNING, CANCELLING, cutoff))
+        for row in rows:
+            status = QUEUED if row["status"] == RUNNING else CANCELLED
+            self._execute("UPDATE jobs SET status = ?, owner = NULL, updated = ? WHERE id = ? AND status = ?",
+                          (status, time.time(), row["id"], row["status"]))
+            logging.warning(f"Job {row['id']} lost its worker, marked {status}")
+
+    def finish(self, job_id, status, summary=None, error=None):
+        self._execute("UPDATE jobs SET status = ?, summary = COALESCE(?, summary), error = ?, "
+                      "owner = NULL, updated = ? WHERE id = ?",
+                      (status, summary, error, time.time(), job_id))
+
+    def set_summary(self, job_id, summary):
+        self._execute("UPDATE jobs SET summary = ?, updated = ? WHERE id = ?", (summary, time.time(), job_id))
+
+    def cancel(self, job_id):
+        """Queued jobs are cancelled at once; running ones stop before their next batch."""
+        now = time.time()
+        self._execute("UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?",
+                      (CANCELLED, now, job_id, QUEUED))
+        self._execute("UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?",
+                      (CANCELLING, now, job_id, RUNNING))
+        return self.get(job_id)
+
+    def resume(self, job_id):
+        """Queues a cancelled or failed job again; files already indexed are not parsed again."""
+        self._execute("UPDATE jobs SET status = ?, error = NULL, updated = ? WHERE id = ? AND status IN (?, ?)",
+                      (QUEUED, time.time(), job_id, CANCELLED, FAILED))
+        return self.get(job_id)
+
+    def status(self, job_id):
+        rows = self._execute("SELECT status FROM jobs WHERE id = ?", (job_id,))
+        return rows[0]["status"] if rows else None
+
+    #----------Files--------------
+    def set_files(self, job_id, paths, status):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, path, status, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(job_id, path) DO UPDATE SET status = excluded.status, updated = excluded.updated",
+                [(job_id, path, status, now) for path in paths])
+            self._conn.execute("COMMIT")
+
+    def set_documents(self, job_id, counts):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE job_files SET documents = ? WHERE job_id = ? AND path = ?",
+                                   [(count, job_id, path) for path, count in counts.items()])
+            self._conn.execute("COMMIT")
+
+    def files(self, job_id, status=None, limit=100):
+        sql, params = "SELECT path, status, documents, updated FROM job_files WHERE job_id = ?", [job_id]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        rows = self._execute(sql + " ORDER BY updated DESC LIMIT ?", params + [limit])
+        return [dict(row) for row in rows]
+
+    #----------Reads--------------
+    def get(self, job_id):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        counts = self._execute("SELECT status, COUNT(*) AS n FROM job_files WHERE job_id = ? GROUP BY status",
+                               (job_id,))
+        job["files"] = {row["status"]: row["n"] for row in counts}
+        job["total"] = sum(job["files"].values())
+        job["done"] = job["files"].get("done", 0)
+        return job
+
+    def active_collections(self):
+        """Collections with queued or running jobs; None stands for the default collection."""
+        rows = self._execute("SELECT DISTINCT collection FROM jobs WHERE status IN (?, ?, ?)", ACTIVE)
+        return {row["collection"] or None for row in rows}
+
+    def list(self, collection=None, limit=20):
+        if collection is None:
+            rows = self._execute("SELECT id FROM jobs ORDER BY created DESC LIMIT ?", (limit,))
+        else:
+            rows = self._execute("SELECT id FROM jobs WHERE collection = ? ORDER BY created DESC LIMIT ?",
+                                 (collection, limit))
+        return [self.get(row["id"]) for row in rows]
+
+
+class JobListener(indexing.SyncListener):
+    """Records sync_directory's progress for one job and watches for cancellation."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def on_plan(self, plan):
+        self.store.set_files(self.job_id, plan.to_parse, "pending")
+        self.store.set_files(self.job_id, plan.deleted, "removed")
+        self.store.set_summary(self.job_id, plan.summary())
+
+    def on_batch(self, batch, sources):
+        counts = dict.fromkeys(batch.to_parse, 0)
+        for _, source in sources:
+            if source in counts:
+                counts[source] += 1
+        self.store.set_files(self.job_id, batch.to_parse, "done")
+        self.store.set_documents(self.job_id, counts)
+
+    def cancelled(self):
+        return self.store.status(self.job_id) == CANCELLING
+
+
+def run_sync_job(job, listener):
+    """Default job runner: syncs the job's directory into a fresh state for its collection.
+
+    Holds the collection's storage lock, so uploads into the same collection wait instead
+    of persisting over the job. Readers that hold the collection (e.g. an IndexManager)
+    reload it when they see the new index version.
+    """
+    collection = job["collection"] or None
+    with storage_lock(collection_dir(collection)):
+        state = load_ingest_state(collection, model_api.load_model(JOB_MODEL))
+        return indexing.sync_directory(job["directory"], state=state,
+                                       batch_files=JOB_CHECKPOINT_FILES, listener=listener)
+
+
+class JobQueue:
+    """Runs ingestion jobs from a JobStore on background worker threads.
+
+    `runner(job, listener)` does the work and returns the sync plan. Progress is
+    checkpointed in the collection's manifest after every batch, so a job that is
+    interrupted or resumed skips every file that was already indexed.
+    """
+
+    def __init__(self, store=None, runner=run_sync_job, workers=JOB_WORKERS, poll_seconds=1.0):
+        self.store = store or JobStore()
+        self.runner = runner
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = set()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self
+            for i in range(self.workers):
+                self._threads.append(threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True))
+            self._threads.append(threading.Thread(target=self._beat, name="ingest-job-heartbeat", daemon=True))
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def submit(self, directory, collection=None):
+        job_id = self.store.create(directory, collection)
+        logging.info(f"Queued ingestion job {job_id} for {directory} (collection {collection or 'default'})")
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id):
+        return self.store.cancel(job_id)
+
+    def resume(self, job_id):
+        job = self.store.resume(job_id)
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def list(self, collection=None, limit=20):
+        return self.store.list(collection, limit)
+
+    def _beat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                running = list(self._running)
+            self.store.heartbeat(running)
+
+    def _work(self):
+        while True:
+            self.store.requeue_stale()
+            job = self.store.claim(self.owner)
+            if job is None:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job["id"]
+        with self._lock:
+            self._running.add(job_id)
+        print(f"Starting ingestion job {job_id}: {job['directory']}")
+        try:
+            plan = self.runner(job, JobListener(self.store, job_id))
+            status = CANCELLED if self.store.status(job_id) == CANCELLING else COMPLETED
+            self.store.finish(job_id, status, summary=plan.summary() if plan is not None else None)
+            print(f"✅ Ingestion job {job_id} {status}")
+        except Exception as e:
+            logging.exception(f"Ingestion job {job_id} failed")
+            self.store.finish(job_id, FAILED, error=str(e))
+            print(f"❌ Ingestion job {job_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+
+@hooks.cache_resource
+def load_job_queue():
+    """The process's job queue, started on first use."""
+    return JobQueue().start()
@@ -0,0 +1,113 @@
+import os
+import json
+from typing import Optional
+
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.types import DEFAULT_BATCH_SIZE
+from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION
+
+# Size of the change log, relative to the snapshot, above which the snapshot is rewritten.
+DOCSTORE_LOG_RATIO = float(os.getenv("DOCSTORE_LOG_RATIO", 1.0))
+
+
+def log_path_for(persist_path):
+    return os.path.splitext(persist_path)[0] + ".log"
+
+
+class LogKVStore(SimpleKVStore):
+    """SimpleKVStore persisted as a JSON snapshot plus an append-only log of later changes.
+
+    persist() appends one JSON line per key put or deleted since the previous persist, so
+    publishing a batch writes that batch rather than the whole collection. The snapshot,
+    in llama_index's own docstore.json format, is rewritten and the log emptied once the
+    log outgrows DOCSTORE_LOG_RATIO of it, which keeps the total I/O linear. Replaying the
+    log is idempotent, and a last line torn by an interrupted append is ignored.
+    """
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        self._changes = {}
+        self._path = None
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        super().put(key, val, collection=collection)
+        self._changes[(collection, key)] = self._collections_mappings[collection][key]
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        deleted = super().delete(key, collection=collection)
+        if deleted:
+            self._changes[(collection, key)] = None
+        return deleted
+
+    #----------Persistence--------------
+    def persist(self, persist_path: str, fs=None) -> None:
+        persist_path = os.path.abspath(persist_path)
+        data = "".join(json.dumps([collection, key, val]) + "\n"
+                       for (collection, key), val in self._changes.items()).encode("utf-8")
+        if persist_path != self._path or self._log_bytes + len(data) > DOCSTORE_LOG_RATIO * self._snapshot_bytes:
+            self._write_snapshot(persist_path)
+        elif data:
+            with open(log_path_for(persist_path), "ab") as f:
+                # Drops the tail of an append that did not finish.
+                f.truncate(self._log_bytes)
+                f.write(data)
+            self._log_bytes += len(data)
+        self._changes = {}
+
+    def _write_snapshot(self, persist_path):
+        os.makedirs(os.path.dirname(persist_path), exist_ok=True)
+        data = json.dumps(self._collections_mappings).encode("utf-8")
+        tmp_path = f"{persist_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, persist_path)
+        # A replayed stale log only repeats changes the new snapshot already holds.
+        with open(log_path_for(persist_path), "wb"):
+            pass
+        self._path, self._snapshot_bytes, self._log_bytes = persist_path, len(data), 0
+
+    def _replay(self, log_path):
+        """Applies the complete lines of the log; returns how many bytes they span."""
+        if not os.path.exists(log_path):
+            return 0
+        with open(log_path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            collection, key, val = json.loads(line)
+            if val is None:
+                SimpleKVStore.delete(self, key, collection=collection)
+            else:
+                SimpleKVStore.put(self, key, val, collection=collection)
+        return end
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, fs=None) -> "LogKVStore":
+        persist_path = os.path.abspath(persist_path)
+        for attempt in range(3):
+            inode = os.stat(persist_path).st_ino
+            with open(persist_path, "rb") as f:
+                store = cls(json.load(f))
+            store._path = persist_path
+            store._snapshot_bytes = os.path.getsize(persist_path)
+            store._log_bytes = store._replay(log_path_for(persist_path))
+            # A writer that replaced the snapshot after we read it may have emptied the log too.
+            if os.stat(persist_path).st_ino == inode:
+                break
+        return store
+
+
+class LogDocumentStore(SimpleDocumentStore):
+    """Docstore whose persist() writes only the nodes added or removed since the last one."""
+
+    def __init__(self, simple_kvstore: Optional[LogKVStore] = None, namespace: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        super().__init__(simple_kvstore or LogKVStore(), namespace=namespace, batch_size=batch_size)
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, namespace: Optional[str] = None,
+                          fs=None) -> "LogDocumentStore":
+        return cls(LogKVStore.from_persist_path(persist_path), namespace)
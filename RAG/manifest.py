@@ -0,0 +1,144 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import List
+
+from logger import logging
+
+MANIFEST_PATH = os.path.join(os.getcwd(), "storage", "manifest.json")
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def iter_files(root_dir):
+    """Yields every non-hidden file under root_dir, like SimpleDirectoryReader does."""
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for name in filenames:
+            if not name.startswith("."):
+                yield os.path.abspath(os.path.join(dirpath, name))
+
+
+@dataclass
+class SyncPlan:
+    root: str
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def to_parse(self):
+        return self.added + self.modified
+
+    @property
+    def to_remove(self):
+        return self.modified + self.deleted
+
+    def is_empty(self):
+        return not (self.added or self.modified or self.deleted)
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.modified)} modified, "
+                f"{len(self.deleted)} deleted, {len(self.unchanged)} unchanged")
+
+
+class FileManifest:
+    """Tracks size, mtime, content hash and produced doc ids for every ingested file."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.files = {}
+
+    def scan(self, root_dir):
+        """Compares root_dir with the manifest. Files are only hashed when size or mtime moved."""
+        root = os.path.abspath(root_dir)
+        plan = SyncPlan(root=root)
+        seen = set()
+
+        for path in iter_files(root):
+            seen.add(path)
+            stat = os.stat(path)
+            entry = self.files.get(path)
+            if entry is None:
+                plan.added.append(path)
+            elif entry.get("incomplete"):
+                plan.modified.append(path)
+            elif entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                plan.unchanged.append(path)
+            elif entry["sha256"] == file_sha256(path):
+                entry["mtime"] = stat.st_mtime
+                plan.unchanged.append(path)
+            else:
+                plan.modified.append(path)
+
+        prefix = root.rstrip(os.sep) + os.sep
+        plan.deleted = [p for p in self.files if p.startswith(prefix) and p not in seen]
+
+        logging.info(f"Manifest scan of {root}: {plan.summary()}")
+        return plan
+
+    def doc_ids_for(self, paths):
+        doc_ids = []
+        for path in paths:
+            doc_ids.extend(self.files.get(path, {}).get("doc_ids", []))
+        return doc_ids
+
+    def zip_members(self, path):
+        """Returns a copy of the member table stored for a zip archive (empty if unknown)."""
+        members = self.files.get(path, {}).get("members", {})
+        return {key: dict(entry) for key, entry in members.items()}
+
+    def record(self, plan, documents, zip_members=None):
+        """Stores the entries for parsed files and drops deleted ones, then saves."""
+        sources = [(doc.id_, doc.metadata.get("source_path")) for doc in documents]
+        self.record_sources(plan, sources, zip_members)
+
+    def record_sources(self, plan, sources, zip_members=None):
+        """Like record, from (doc_id, source_path) pairs instead of the documents themselves."""
+        zip_members = zip_members or {}
+        doc_ids = {path: [] for path in plan.to_parse}
+        for doc_id, source in sources:
+            if source in doc_ids and source not in zip_members:
+                doc_ids[source].append(doc_id)
+        for path, members in zip_members.items():
+            doc_ids[path] = [i for entry in members.values() for i in entry.get("doc_ids", [])]
+
+        for path, ids in doc_ids.items():
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            self.files[path] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha256": file_sha256(path),
+                "doc_ids": ids,
+            }
+            if path in zip_members:
+                self.files[path]["members"] = zip_members[path]
+                if any(entry.get("failed") for entry in zip_members[path].values()):
+                    # Synced again next time, so the members that failed are retried.
+                    self.files[path]["incomplete"] = True
+        for path in plan.deleted:
+            self.files.pop(path, None)
+        self.save()
@@ -3,9 +3,7 @@ from dotenv import load_dotenv
 import sys
 from exception import customexception
 from logger import logging
-
-
-import streamlit as st
+from RAG import hooks
 
 load_dotenv()
 
@@ -13,11 +11,14 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 
-@st.cache_resource
+@hooks.cache_resource
 def load_model(model_name):
     try:
         
-        if model_name == 'Gemini':
+        if model_name == 'offline':
+            from RAG.offline_models import OfflineLLM
+            model = OfflineLLM()
+        elif model_name == 'Gemini':
             from llama_index.llms.gemini import Gemini
             import google.generativeai as genai
             model = Gemini(model="models/gemini-2.5-flash", api_key=GOOGLE_API_KEY)
@@ -0,0 +1,326 @@
+import os
+import json
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+from logger import logging
+
+NUMPY_STORE_DTYPE = os.getenv("NUMPY_STORE_DTYPE", "float16")  # float32, float16 or int8
+NUMPY_SEARCH_BLOCK = int(os.getenv("NUMPY_SEARCH_BLOCK", 2048))
+
+NUMPY_COMPACT_RATIO = float(os.getenv("NUMPY_COMPACT_RATIO", 0.25))  # deleted share of rows that triggers a rewrite
+
+VECTORS_FILE = "numpy_vectors.npy"  # single-file layout written before segments
+SCALES_FILE = "numpy_scales.npy"
+META_FILE = "numpy_meta.json"
+SEGMENT_PREFIX = "numpy_seg_"
+DELETED_PREFIX = "numpy_deleted_"
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """Exact cosine search over one contiguous, optionally compressed embedding matrix.
+
+    Vectors are unit-normalized on insert and stored as float32, float16 or int8 (with a
+    per-row scale), which is 8x, 16x or 32x smaller than llama_index's lists of Python
+    floats. A query is a blocked matrix-vector product plus argpartition.
+
+    The matrix is persisted as segments of rows: persist() writes the rows added since the
+    last persist as a new segment and appends the deleted row numbers to a tombstone file,
+    then atomically replaces numpy_meta.json, which names the committed segments. Trailing
+    segments are merged while the one before is no larger than those after it, so a row is
+    rewritten O(log n) times; once deleted rows pass NUMPY_COMPACT_RATIO everything is
+    rewritten as one segment. A single segment is memory-mapped on load; the first insert
+    copies it into RAM.
+    """
+
+    stores_text: bool = False
+    dtype: str = Field(default=NUMPY_STORE_DTYPE)
+    block_size: int = Field(default=NUMPY_SEARCH_BLOCK)
+
+    _vectors: Any = PrivateAttr(default=None)
+    _scales: Any = PrivateAttr(default=None)
+    _alive: Any = PrivateAttr(default=None)
+    _count: int = PrivateAttr(default=0)
+    _ids: list = PrivateAttr(default_factory=list)
+    _ref_ids: list = PrivateAttr(default_factory=list)
+    _rows: dict = PrivateAttr(default_factory=dict)
+    _ref_docs: dict = PrivateAttr(default_factory=dict)
+    # Persisted state: segments ({"name", "rows"}) in row order, and rows deleted since.
+    _persist_dir: Optional[str] = PrivateAttr(default=None)
+    _segments: list = PrivateAttr(default_factory=list)
+    _persisted: int = PrivateAttr(default=0)
+    _deleted_file: Optional[str] = PrivateAttr(default=None)
+    _deleted_bytes: int = PrivateAttr(default=0)
+    _pending_deleted: list = PrivateAttr(default_factory=list)
+    _lock = PrivateAttr(default_factory=threading.RLock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._vectors
+
+    def __bool__(self):
+        # StorageContext.from_defaults tests `if vector_store:`; an empty store must not become a simple one.
+        return True
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def nbytes(self):
+        if self._vectors is None or isinstance(self._vectors, np.memmap):
+            return len(self) * 200
+        return self._vectors.nbytes + self._scales.nbytes + self._alive.nbytes + len(self) * 200
+
+    #----------Updates--------------
+    def _quantize(self, vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        if self.dtype != "int8":
+            return vectors.astype(DTYPES[self.dtype]), np.ones(len(vectors), dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _ensure_capacity(self, count, dim):
+        needed = self._count + count
+        if self._vectors is not None and needed <= len(self._vectors) and not isinstance(self._vectors, np.memmap):
+            return
+        capacity = max(needed, 2 * (len(self._vectors) if self._vectors is not None else 0), 1024)
+        vectors = np.zeros((capacity, dim), dtype=DTYPES[self.dtype])
+        scales = np.ones(capacity, dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        if self._vectors is not None:
+            vectors[:self._count] = self._vectors[:self._count]
+            scales[:self._count] = self._scales[:self._count]
+            alive[:self._count] = self._alive[:self._count]
+        self._vectors, self._scales, self._alive = vectors, scales, alive
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        node_ids = [node.node_id for node in nodes]
+        self.add_embeddings(node_ids, [node.get_embedding() for node in nodes],
+                            [node.ref_doc_id for node in nodes])
+        return node_ids
+
+    def add_embeddings(self, node_ids, embeddings, ref_doc_ids):
+        vectors, scales = self._quantize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self.delete_nodes([node_id for node_id in node_ids if node_id in self._rows])
+            self._ensure_capacity(len(node_ids), vectors.shape[1])
+            start, end = self._count, self._count + len(node_ids)
+            self._vectors[start:end] = vectors
+            self._scales[start:end] = scales
+            self._alive[start:end] = True
+            for row, (node_id, ref_doc_id) in enumerate(zip(node_ids, ref_doc_ids), start=start):
+                self._rows[node_id] = row
+                self._ref_docs.setdefault(ref_doc_id, []).append(node_id)
+            self._ids.extend(node_ids)
+            self._ref_ids.extend(ref_doc_ids)
+            self._count = end
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            self.delete_nodes(self._ref_docs.pop(ref_doc_id, []))
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        if filters is not None:
+            raise NotImplementedError("NumpyVectorStore does not support metadata filters")
+        with self._lock:
+            rows = [self._rows.pop(node_id) for node_id in node_ids or [] if node_id in self._rows]
+            if rows:
+                self._alive[rows] = False
+                self._pending_deleted.extend(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = self._scales = self._alive = None
+            self._count, self._ids, self._ref_ids, self._rows, self._ref_docs = 0, [], [], {}, {}
+            self._persist_dir, self._segments, self._persisted, self._pending_deleted = None, [], 0, []
+
+    #----------Search--------------
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise NotImplementedError("NumpyVectorStore does not support metadata filters")
+        with self._lock:
+            top_k = min(query.similarity_top_k, len(self._rows))
+            if top_k == 0 or query.query_embedding is None:
+                return VectorStoreQueryResult(nodes=None, similarities=[], ids=[])
+
+            vector = np.asarray(query.query_embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            scores = np.empty(self._count, dtype=np.float32)
+            # Converting one block at a time keeps BLAS float32 speed without a full float32 copy.
+            for start in range(0, self._count, self.block_size):
+                end = min(start + self.block_size, self._count)
+                scores[start:end] = self._vectors[start:end].astype(np.float32) @ vector
+            scores *= self._scales[:self._count]
+            scores[~self._alive[:self._count]] = -np.inf
+
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top])]
+            ids = [self._ids[row] for row in top]
+        return VectorStoreQueryResult(nodes=None, similarities=scores[top].tolist(), ids=ids)
+
+    #----------Persistence--------------
+    def _compact(self):
+        """Drops deleted rows so they are not written to disk."""
+        live = np.flatnonzero(self._alive[:self._count])
+        if len(live) == self._count:
+            return
+        self._vectors = np.ascontiguousarray(self._vectors[live])
+        self._scales = np.ascontiguousarray(self._scales[live])
+        self._alive = np.ones(len(live), dtype=bool)
+        self._ids = [self._ids[row] for row in live]
+        self._ref_ids = [self._ref_ids[row] for row in live]
+        self._rows = {node_id: row for row, node_id in enumerate(self._ids)}
+        self._count = len(live)
+        self._ref_docs = {ref_doc_id: [i for i in node_ids if i in self._rows]
+                          for ref_doc_id, node_ids in self._ref_docs.items()}
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        """persist_path is the default vector store file name; files go into its directory."""
+        persist_dir = os.path.dirname(os.path.abspath(persist_path))
+        os.makedirs(persist_dir, exist_ok=True)
+        with self._lock:
+            if self._vectors is None:
+                return
+            deleted = self._count - len(self._rows)
+            if persist_dir != self._persist_dir or deleted > NUMPY_COMPACT_RATIO * self._count:
+                self._rewrite(persist_dir)
+            elif self._count > self._persisted or self._pending_deleted:
+                self._append(persist_dir)
+
+    def _next_name(self, persist_dir, prefix):
+        """A file name no earlier segment used, so a reader's memory map is never overwritten."""
+        numbers = [int(name[len(prefix):].split("_")[0].split(".")[0]) for name in os.listdir(persist_dir)
+                   if name.startswith(prefix)]
+        return f"{prefix}{max(numbers, default=0) + 1:06d}"
+
+    def _write_segment(self, persist_dir, start, end):
+        name = self._next_name(persist_dir, SEGMENT_PREFIX)
+        np.save(os.path.join(persist_dir, f"{name}_vectors.npy"), self._vectors[start:end])
+        np.save(os.path.join(persist_dir, f"{name}_scales.npy"), self._scales[start:end])
+        with open(os.path.join(persist_dir, f"{name}_ids.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids[start:end], "ref_doc_ids": self._ref_ids[start:end]}, f)
+        return {"name": name, "rows": end - start}
+
+    def _write_meta(self, persist_dir):
+        tmp_meta = os.path.join(persist_dir, META_FILE + ".tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "segments": self._segments,
+                       "deleted": self._deleted_file, "deleted_bytes": self._deleted_bytes}, f)
+        os.replace(tmp_meta, os.path.join(persist_dir, META_FILE))
+
+    def _remove_unreferenced(self, persist_dir):
+        keep = {self._deleted_file} | {segment["name"] + suffix for segment in self._segments
+                                       for suffix in ("_vectors.npy", "_scales.npy", "_ids.json")}
+        for name in os.listdir(persist_dir):
+            if name not in keep and (name in (VECTORS_FILE, SCALES_FILE)
+                                     or name.startswith((SEGMENT_PREFIX, DELETED_PREFIX))):
+                os.remove(os.path.join(persist_dir, name))
+
+    def _rewrite(self, persist_dir):
+        """Writes the live rows as one segment with no tombstones and removes every other file."""
+        self._compact()
+        self._segments = [self._write_segment(persist_dir, 0, self._count)]
+        self._deleted_file = self._next_name(persist_dir, DELETED_PREFIX) + ".bin"
+        open(os.path.join(persist_dir, self._deleted_file), "wb").close()
+        self._deleted_bytes = 0
+        self._write_meta(persist_dir)
+        self._remove_unreferenced(persist_dir)
+        self._persist_dir, self._persisted, self._pending_deleted = persist_dir, self._count, []
+        logging.info(f"Rewrote {self._count} {self.dtype} vectors in {persist_dir}")
+
+    def _append(self, persist_dir):
+        """Writes the rows added since the last persist as a segment, merged with smaller ones before it."""
+        replaced = []
+        if self._count > self._persisted:
+            start = self._persisted
+            while self._segments and self._segments[-1]["rows"] <= self._count - start:
+                replaced.append(self._segments.pop())
+                start -= replaced[-1]["rows"]
+            self._segments.append(self._write_segment(persist_dir, start, self._count))
+        if self._pending_deleted:
+            data = np.asarray(self._pending_deleted, dtype=np.int64).tobytes()
+            with open(os.path.join(persist_dir, self._deleted_file), "ab") as f:
+                # Drops the tail of an append that did not finish.
+                f.truncate(self._deleted_bytes)
+                f.write(data)
+            self._deleted_bytes += len(data)
+        self._write_meta(persist_dir)
+        for segment in replaced:
+            for suffix in ("_vectors.npy", "_scales.npy", "_ids.json"):
+                os.remove(os.path.join(persist_dir, segment["name"] + suffix))
+        self._persisted, self._pending_deleted = self._count, []
+
+    @classmethod
+    def exists(cls, persist_dir):
+        return os.path.exists(os.path.join(persist_dir, META_FILE))
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, **kwargs):
+        """Loads the store persisted in persist_dir, or returns an empty one."""
+        if not cls.exists(persist_dir):
+            return cls(**kwargs)
+        for attempt in range(3):
+            try:
+                return cls._load(persist_dir, **kwargs)
+            except FileNotFoundError:
+                # A writer merged away the segments named by the meta file we read.
+                if attempt == 2:
+                    raise
+
+    @classmethod
+    def _load(cls, persist_dir, **kwargs):
+        persist_dir = os.path.abspath(persist_dir)
+        with open(os.path.join(persist_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(dtype=meta["dtype"], **kwargs)
+        if "segments" not in meta:
+            # Single-file layout; the first persist rewrites it as a segment.
+            vectors = np.load(os.path.join(persist_dir, VECTORS_FILE), mmap_mode="r")
+            scales = np.load(os.path.join(persist_dir, SCALES_FILE), mmap_mode="r")
+            ids = meta["ids"]
+            ref_of = {node_id: ref_doc_id for ref_doc_id, node_ids in meta["ref_docs"].items() for node_id in node_ids}
+            ref_ids = [ref_of.get(node_id) for node_id in ids]
+            deleted = np.zeros(0, dtype=np.int64)
+        else:
+            parts = [[np.load(os.path.join(persist_dir, f"{segment['name']}_{table}.npy"), mmap_mode="r")
+                      for table in ("vectors", "scales")] for segment in meta["segments"]]
+            vectors, scales = parts[0] if len(parts) == 1 else map(np.concatenate, zip(*parts))
+            ids, ref_ids = [], []
+            for segment in meta["segments"]:
+                with open(os.path.join(persist_dir, f"{segment['name']}_ids.json"), "r", encoding="utf-8") as f:
+                    segment_ids = json.load(f)
+                ids.extend(segment_ids["ids"])
+                ref_ids.extend(segment_ids["ref_doc_ids"])
+            with open(os.path.join(persist_dir, meta["deleted"]), "rb") as f:
+                deleted = np.frombuffer(f.read(meta["deleted_bytes"]), dtype=np.int64)
+            store._persist_dir, store._segments = persist_dir, meta["segments"]
+            store._deleted_file, store._deleted_bytes = meta["deleted"], meta["deleted_bytes"]
+
+        store._vectors, store._scales = vectors, scales
+        store._ids, store._ref_ids = ids, ref_ids
+        store._count = store._persisted = len(ids)
+        store._alive = np.ones(store._count, dtype=bool)
+        store._alive[deleted] = False
+        for row in np.flatnonzero(store._alive):
+            store._rows[ids[row]] = int(row)
+            store._ref_docs.setdefault(ref_ids[row], []).append(ids[row])
+        logging.info(f"Loaded {len(store._rows)} {store.dtype} vectors from {persist_dir}")
+        return store
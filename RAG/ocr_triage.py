@@ -0,0 +1,143 @@
+import os
+from typing import List
+
+import pikepdf
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+from logger import logging
+from RAG.ingest_profiler import profile_stage
+
+OCR_DEVICE = os.getenv("OCR_DEVICE", "auto")  # auto, cpu or cuda
+OCR_THREADS = int(os.getenv("OCR_THREADS", 0))  # 0: the CPUs shared among conversion workers
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", 20))
+OCR_MIN_IMAGE_PIXELS = int(os.getenv("OCR_MIN_IMAGE_PIXELS", 200 * 200))
+OCR_TRIAGE = os.getenv("OCR_TRIAGE", "1") != "0"
+
+_TEXT_OPERATORS = {"Tj", "TJ", "'", '"'}
+_MAX_FORM_DEPTH = 4
+
+
+def has_gpu():
+    if OCR_DEVICE != "auto":
+        return OCR_DEVICE == "cuda"
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def ocr_threads(workers=1):
+    return OCR_THREADS or max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def accelerator_options(workers=1):
+    """Docling accelerator settings: CUDA when available, else the CPU with one thread pool per worker."""
+    try:
+        from docling.datamodel.accelerator_options import AcceleratorDevice, AcceleratorOptions
+    except ImportError:  # docling < 2.39
+        from docling.datamodel.pipeline_options import AcceleratorDevice, AcceleratorOptions
+
+    device = AcceleratorDevice.CUDA if has_gpu() else AcceleratorDevice.CPU
+    return AcceleratorOptions(device=device, num_threads=ocr_threads(workers))
+
+
+#----------Page Triage--------------
+def _image_pixels(image):
+    return int(image.get("/Width", 0)) * int(image.get("/Height", 0))
+
+
+def _scan(content_owner, resources, depth=0):
+    """(text characters, whether a sizeable bitmap is drawn) for a content stream and its forms."""
+    xobjects = resources.get("/XObject", {}) if isinstance(resources, pikepdf.Dictionary) else {}
+    chars, bitmap = 0, False
+    for instruction in pikepdf.parse_content_stream(content_owner):
+        if isinstance(instruction, pikepdf.ContentStreamInlineImage):
+            image = instruction.iimage
+            bitmap = bitmap or image.width * image.height >= OCR_MIN_IMAGE_PIXELS
+            continue
+        operator, operands = str(instruction.operator), instruction.operands
+        if operator in _TEXT_OPERATORS:
+            for operand in operands:
+                items = operand if isinstance(operand, pikepdf.Array) else [operand]
+                chars += sum(len(bytes(item)) for item in items if isinstance(item, pikepdf.String))
+        elif operator == "Do" and operands and operands[0] in xobjects:
+            xobject = xobjects[operands[0]]
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                bitmap = bitmap or _image_pixels(xobject) >= OCR_MIN_IMAGE_PIXELS
+            elif subtype == "/Form" and depth < _MAX_FORM_DEPTH:
+                form_chars, form_bitmap = _scan(xobject, xobject.get("/Resources", resources), depth + 1)
+                chars += form_chars
+                bitmap = bitmap or form_bitmap
+    return chars, bitmap
+
+
+def _page_resources(page):
+    """The page's /Resources, which may be inherited from the page tree."""
+    node = page.obj
+    while node is not None:
+        if "/Resources" in node:
+            return node["/Resources"]
+        node = node.get("/Parent")
+    return None
+
+
+def page_needs_ocr(page):
+    """True when a page draws a sizeable bitmap and has too little text layer to be read.
+
+    Blank pages and pages of vector graphics have nothing for OCR to read.
+    """
+    chars, bitmap = _scan(page, _page_resources(page))
+    return bitmap and chars < OCR_MIN_TEXT_CHARS
+
+
+def triage_pdf(pdf_path):
+    """Counts the pages that need OCR; every page does if the PDF cannot be inspected."""
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            pages = len(pdf.pages)
+            ocr_pages = sum(page_needs_ocr(page) for page in pdf.pages)
+    except Exception as e:
+        logging.warning(f"OCR triage failed on {pdf_path}, OCR'ing every page: {e}")
+        return {"pages": None, "ocr_pages": None}
+    return {"pages": pages, "ocr_pages": ocr_pages}
+
+
+class AdaptiveOcrReader(BaseReader):
+    """Converts PDFs whose pages all have a text layer without OCR.
+
+    PDFs with scanned or image-only pages go to the OCR reader. Its pipeline OCRs only bitmap regions, so text-layer pages in the same file
+    still skip OCR. The triage is recorded on the file's ingestion profile. A PDF that either
+    reader's Docling cache already holds is served from it without being triaged.
+    """
+
+    def __init__(self, text_reader, ocr_reader):
+        self.text_reader = text_reader
+        self.ocr_reader = ocr_reader
+
+    def cached_reader(self, file_path):
+        """The reader whose Docling cache holds file_path, or None."""
+        for reader in (self.text_reader, self.ocr_reader):
+            if hasattr(reader, "is_cached") and reader.is_cached(file_path):
+                return reader
+        return None
+
+    def is_cached(self, file_path):
+        return self.cached_reader(file_path) is not None
+
+    def load_data(self, file_path, extra_info=None, **load_kwargs) -> List[Document]:
+        reader = self.cached_reader(file_path)
+        if reader is not None:
+            return reader.load_data(file_path, extra_info=extra_info, **load_kwargs)
+
+        profile_path = (extra_info or {}).get("file_path", str(file_path))
+        with profile_stage("ocr_triage", profile_path) as counts:
+            triage = triage_pdf(file_path) if OCR_TRIAGE else {"pages": None, "ocr_pages": None}
+            if triage["pages"] is not None:
+                counts["ocr_pages"] = triage["ocr_pages"]
+                counts["ocr_skipped_pages"] = triage["pages"] - triage["ocr_pages"]
+
+        reader = self.ocr_reader if triage["ocr_pages"] is None or triage["ocr_pages"] else self.text_reader
+        return reader.load_data(file_path, extra_info=extra_info, **load_kwargs)
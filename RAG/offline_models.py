@@ -0,0 +1,130 @@
+import os
+import re
+import time
+import zlib
+from typing import Any, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import CompletionResponse, CompletionResponseGen, LLMMetadata
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+# Deterministic local stand-ins for the Ollama embedder, the Groq/Gemini LLMs and the
+# cross-encoder, selected with the model name "offline". They need no network or model
+# download, so benchmarks and development runs are reproducible.
+
+OFFLINE_EMBED_DIM = int(os.getenv("OFFLINE_EMBED_DIM", 384))
+OFFLINE_EMBED_MS = float(os.getenv("OFFLINE_EMBED_MS", 0))  # simulated latency per batch
+OFFLINE_LLM_TOKENS = int(os.getenv("OFFLINE_LLM_TOKENS", 64))
+OFFLINE_LLM_TOKEN_MS = float(os.getenv("OFFLINE_LLM_TOKEN_MS", 0))  # simulated latency per token
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+class HashEmbedding(BaseEmbedding):
+    """Hashes words and word pairs into a fixed-size unit vector.
+
+    Texts that share words get similar vectors, so retrieval quality is meaningful.
+    """
+
+    dim: int = Field(default=OFFLINE_EMBED_DIM)
+    latency_ms: float = Field(default=OFFLINE_EMBED_MS)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = tokenize(text)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._vector(text) for text in texts]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._get_text_embeddings(texts)
+
+
+class OfflineLLM(CustomLLM):
+    """Answers with the first words of the context in the prompt, one token per word."""
+
+    max_tokens: int = Field(default=OFFLINE_LLM_TOKENS)
+    token_latency_ms: float = Field(default=OFFLINE_LLM_TOKEN_MS)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OfflineLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(num_output=self.max_tokens, model_name="offline")
+
+    def _tokens(self, prompt):
+        context = prompt.split("Context:", 1)[-1]
+        return context.split()[:self.max_tokens] or ["offline"]
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        tokens = self._tokens(prompt)
+        if self.token_latency_ms:
+            time.sleep(len(tokens) * self.token_latency_ms / 1000)
+        return CompletionResponse(text=" ".join(tokens))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        def gen():
+            text = ""
+            for token in self._tokens(prompt):
+                if self.token_latency_ms:
+                    time.sleep(self.token_latency_ms / 1000)
+                delta = token if not text else f" {token}"
+                text += delta
+                yield CompletionResponse(text=text, delta=delta)
+        return gen()
+
+
+class OverlapRerank(BaseNodePostprocessor):
+    """Orders nodes by the share of query words they contain."""
+
+    top_n: int = Field(default=5)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OverlapRerank"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Missing query bundle in extra info.")
+        query_words = set(tokenize(query_bundle.query_str))
+        for node in nodes:
+            words = set(tokenize(node.node.get_content()))
+            node.score = len(query_words & words) / (len(query_words) or 1)
+        return sorted(nodes, key=lambda n: n.score, reverse=True)[: self.top_n]
@@ -1,30 +1,40 @@
-import streamlit as st
-from llama_index.core.postprocessor import MetadataReplacementPostProcessor
-from llama_index.core.postprocessor import SentenceTransformerRerank
-from llama_index.core.response_synthesizers import get_response_synthesizer
-from llama_index.core import PromptTemplate
+from RAG import hooks
+from RAG.tracing import start_trace, trace_span
+import RAG.indexing as indexing
 import asyncio
 
-@st.cache_resource
+@hooks.cache_resource
 def load_reranker():
-    """Loads the reranker model once and caches it."""
-    return SentenceTransformerRerank(
-        model="BAAI/bge-reranker-base", 
+    """Loads the reranker model once, warms it up and caches it."""
+    from RAG.rerank import RERANK_MODEL, CachedCrossEncoderRerank
+
+    if RERANK_MODEL == "offline":
+        from RAG.offline_models import OverlapRerank
+        return OverlapRerank(top_n=5)
+
+    return CachedCrossEncoderRerank(
+        model=RERANK_MODEL, 
         top_n=5
-    )
+    ).warmup()
 
-@st.cache_resource
-def load_meta_replacer():
-    """Initializes the metadata replacer once."""
-    return MetadataReplacementPostProcessor(
-        target_metadata_key="window"
+@hooks.cache_resource
+def load_meta_replacer(persist_dir=None):
+    """Initializes the window replacer once per collection."""
+    from RAG.sentence_windows import WindowReplacementPostProcessor
+
+    return WindowReplacementPostProcessor(
+        target_metadata_key="window",
+        store_dir=persist_dir
     )
 
-reranker = load_reranker()
-meta_replacer = load_meta_replacer()
+@hooks.cache_resource
+def load_answer_cache():
+    from RAG.answer_cache import AnswerCache
+
+    return AnswerCache()
 
 
-custom_prompt = PromptTemplate(template="""
+CUSTOM_PROMPT = """
 You are a precise and factual assistant. Your task is to answer the user's question based *only* on the provided context.
 
 Follow these rules:
@@ -44,33 +54,198 @@ Question:
 {query_str}
 
 Answer:
-""")
+"""
 
-response_synthesizer = get_response_synthesizer(
-    response_mode="compact",
-    text_qa_template=custom_prompt
-)
+@hooks.cache_resource
+def load_prompt():
+    from llama_index.core import PromptTemplate
 
-async def rag_pipeline(user_query, llm_model):
-    # These objects (reranker, etc.) are available 
-    # from the main script's scope.
-    fusion_retriever = st.session_state.fusion_retriever
+    return PromptTemplate(template=CUSTOM_PROMPT)
 
-    nodes = await fusion_retriever.aretrieve(user_query)
+def build_synthesizer(llm_model, streaming=False):
+    """response_mode="compact" synthesizer that also times prompt compaction."""
+    from RAG.traced_components import TracedCompactAndRefine
 
-    replaced_nodes = meta_replacer.postprocess_nodes(
-        nodes=nodes
+    return TracedCompactAndRefine(
+        llm=llm_model,
+        text_qa_template=load_prompt(),
+        streaming=streaming
     )
-    reranked_nodes = reranker.postprocess_nodes(
-        nodes=replaced_nodes, 
-        query_str=user_query
-    )
-    
-    # Note: .synthesize() is often not async. 
-    # If it is, you should await it.
-    final_response = response_synthesizer.synthesize(
-        query=user_query,   
-        nodes=reranked_nodes 
-    )
-    
-    return final_response
\ No newline at end of file
+
+class ThinkStripper:
+    """Removes <think>...</think> blocks from a token stream as it arrives.
+
+    Text that could still be the start of a tag is held back until the next token.
+    """
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_think = False
+        self.started = False
+
+    @staticmethod
+    def _partial_tag(text, tag):
+        for size in range(min(len(text), len(tag) - 1), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
+
+    def feed(self, token):
+        self.buffer += token
+        out = []
+        while self.buffer:
+            if self.in_think:
+                idx = self.buffer.find(self.CLOSE)
+                if idx < 0:
+                    self.buffer = self.buffer[-(len(self.CLOSE) - 1):]
+                    break
+                self.buffer = self.buffer[idx + len(self.CLOSE):]
+                self.in_think = False
+            else:
+                idx = self.buffer.find(self.OPEN)
+                if idx >= 0:
+                    out.append(self.buffer[:idx])
+                    self.buffer = self.buffer[idx + len(self.OPEN):]
+                    self.in_think = True
+                    continue
+                keep = self._partial_tag(self.buffer, self.OPEN)
+                out.append(self.buffer[:len(self.buffer) - keep])
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                break
+        return self._emit("".join(out))
+
+    def flush(self):
+        text = "" if self.in_think else self.buffer
+        self.buffer = ""
+        return self._emit(text)
+
+    def _emit(self, text):
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        return text
+
+async def retrieve_context(user_query, fusion_retriever=None, state=None):
+    fusion_retriever = fusion_retriever or hooks.get_state(state).fusion_retriever
+
+    with trace_span("retrieve.fusion") as span:
+        nodes = await fusion_retriever.aretrieve(user_query)
+        span["nodes"] = len(nodes)
+
+    with trace_span("postprocess.window"):
+        replaced_nodes = load_meta_replacer(indexing.state_persist_dir(state)).postprocess_nodes(
+            nodes=nodes
+        )
+    # The cross-encoder is CPU-bound, keep it off the event loop.
+    with trace_span("rerank", nodes_in=len(replaced_nodes)) as span:
+        reranked_nodes = await asyncio.to_thread(
+            load_reranker().postprocess_nodes,
+            replaced_nodes,
+            query_str=user_query
+        )
+        span["nodes_out"] = len(reranked_nodes)
+    return reranked_nodes
+
+def cache_scope(llm_model, state=None):
+    """Answer cache keys: the collection, its index version and the LLM."""
+    state = hooks.get_state(state)
+    return {
+        "collection": state.get("collection_id") or "",
+        "index_version": indexing.get_index_version(indexing.state_persist_dir(state)),
+        "model": llm_model.metadata.model_name,
+    }
+
+async def lookup_cached_answer(user_query, llm_model, state=None):
+    """Returns (cached (answer, source_nodes) or None, query embedding)."""
+    from llama_index.core import Settings
+
+    with trace_span("embed.query"):
+        query_embedding = await Settings.embed_model.aget_query_embedding(user_query)
+    with trace_span("answer_cache.lookup") as span:
+        hit = load_answer_cache().lookup(user_query, query_embedding=query_embedding, 
+                                         **cache_scope(llm_model, state))
+        span["hit"] = hit is not None
+    return hit, query_embedding
+
+def start_query_trace(user_query, llm_model, state=None):
+    from RAG.traced_components import count_tokens
+
+    return start_trace("query", collection=hooks.get_state(state).get("collection_id") or "",
+                       model=llm_model.metadata.model_name, query_tokens=count_tokens(user_query))
+
+async def rag_pipeline(user_query, llm_model, fusion_retriever=None, state=None):
+    from llama_index.core.base.response.schema import Response
+    from RAG.traced_components import count_tokens
+
+    trace = start_query_trace(user_query, llm_model, state)
+    with trace.active():
+        hit, query_embedding = await lookup_cached_answer(user_query, llm_model, state)
+        if hit is not None:
+            trace.finish(cache_hit=True)
+            return Response(response=hit[0], source_nodes=hit[1])
+
+        reranked_nodes = await retrieve_context(user_query, fusion_retriever, state)
+
+        with trace_span("synthesize") as span:
+            final_response = await build_synthesizer(llm_model).asynthesize(
+                query=user_query,   
+                nodes=reranked_nodes 
+            )
+            span["completion_tokens"] = count_tokens(final_response.response or "")
+
+        stripper = ThinkStripper()
+        answer = (stripper.feed(final_response.response or "") + stripper.flush()).strip()
+        load_answer_cache().store(user_query, answer=answer, source_nodes=final_response.source_nodes, 
+                                  query_embedding=query_embedding, **cache_scope(llm_model, state))
+    trace.finish(cache_hit=False)
+    final_response.response = answer
+    return final_response
+
+async def astream_answer(user_query, llm_model, fusion_retriever=None, state=None):
+    """Yields the answer as the LLM produces it, with <think> blocks removed.
+
+    The trace is only made active between yields: a context variable set in an async
+    generator does not survive across the consumer's iterations.
+    """
+    from RAG.traced_components import count_tokens
+
+    trace = start_query_trace(user_query, llm_model, state)
+    with trace.active():
+        hit, query_embedding = await lookup_cached_answer(user_query, llm_model, state)
+    if hit is not None:
+        trace.finish(cache_hit=True)
+        yield hit[0]
+        return
+
+    with trace.active():
+        reranked_nodes = await retrieve_context(user_query, fusion_retriever, state)
+
+        with trace_span("synthesize"):
+            streaming_response = await build_synthesizer(llm_model, streaming=True).asynthesize(
+                query=user_query,
+                nodes=reranked_nodes
+            )
+
+    stripper = ThinkStripper()
+    answer, tokens = [], []
+    stream_start, first_token_ms = trace.elapsed_ms(), None
+    async for token in streaming_response.async_response_gen():
+        if first_token_ms is None:
+            first_token_ms = trace.elapsed_ms() - stream_start
+        tokens.append(token)
+        text = stripper.feed(token)
+        if text:
+            answer.append(text)
+            yield text
+    tail = stripper.flush().rstrip()
+    if tail:
+        answer.append(tail)
+        yield tail
+    trace.add_span("llm.stream", stream_start, trace.elapsed_ms() - stream_start, 
+                   first_token_ms=first_token_ms, completion_tokens=count_tokens("".join(tokens)))
+
+    load_answer_cache().store(user_query, answer="".join(answer).strip(), 
+                              source_nodes=streaming_response.source_nodes,
+                              query_embedding=query_embedding, **cache_scope(llm_model, state))
+    trace.finish(cache_hit=False)
@@ -0,0 +1,118 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from logger import logging
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-base")
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "onnx")  # torch, onnx or int8
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 512))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 20000))
+
+
+def load_cross_encoder(model, backend=RERANK_BACKEND, max_length=RERANK_MAX_LENGTH):
+    """Loads a CPU cross-encoder with ONNX Runtime, int8 dynamic quantization or plain torch.
+
+    Falls back to torch when the requested backend is not available.
+    """
+    from sentence_transformers import CrossEncoder
+
+    if backend == "onnx":
+        try:
+            return CrossEncoder(model, max_length=max_length, device="cpu", backend="onnx")
+        except Exception as e:
+            logging.warning(f"ONNX backend unavailable for {model} ({e}), using torch")
+
+    encoder = CrossEncoder(model, max_length=max_length, device="cpu")
+    if backend == "int8":
+        import torch
+        encoder.model = torch.quantization.quantize_dynamic(
+            encoder.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return encoder
+
+
+class CachedCrossEncoderRerank(BaseNodePostprocessor):
+    """Cross-encoder reranker with batched CPU scoring and a (query hash, node id) score cache."""
+
+    model: str = Field(default=RERANK_MODEL)
+    backend: str = Field(default=RERANK_BACKEND)
+    top_n: int = Field(default=5)
+    max_length: int = Field(default=RERANK_MAX_LENGTH)
+    batch_size: int = Field(default=RERANK_BATCH_SIZE)
+    cache_size: int = Field(default=RERANK_CACHE_SIZE)
+
+    _encoder = PrivateAttr(default=None)
+    _cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _latencies: deque = PrivateAttr(default_factory=lambda: deque(maxlen=1000))
+    _lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedCrossEncoderRerank"
+
+    def warmup(self):
+        """Loads the model and runs one pair so the first query does not pay for initialization."""
+        if self._encoder is None:
+            self._encoder = load_cross_encoder(self.model, self.backend, self.max_length)
+            self._encoder.predict([("warmup", "warmup")], show_progress_bar=False)
+        return self
+
+    def latency_report(self):
+        if not self._latencies:
+            return {"queries": 0, "p50_ms": 0.0, "p95_ms": 0.0}
+        p50, p95 = np.percentile(np.array(self._latencies) * 1000, [50, 95])
+        return {"queries": len(self._latencies), "p50_ms": float(p50), "p95_ms": float(p95)}
+
+    def _score(self, query_str, nodes):
+        query_hash = hashlib.sha256(query_str.encode("utf-8")).hexdigest()[:16]
+        keys = [(query_hash, n.node.node_id) for n in nodes]
+        with self._lock:
+            scores = {k: self._cache[k] for k in keys if k in self._cache}
+            for k in scores:
+                self._cache.move_to_end(k)
+
+        missing = [(k, n) for k, n in zip(keys, nodes) if k not in scores]
+        if missing:
+            pairs = [(query_str, n.node.get_content(metadata_mode=MetadataMode.EMBED)) for _, n in missing]
+            predicted = self._encoder.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self._lock:
+                for (k, _), score in zip(missing, predicted):
+                    scores[k] = self._cache[k] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [scores[k] for k in keys]
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None:
+            raise ValueError("Missing query bundle in extra info.")
+        if not nodes:
+            return []
+
+        self.warmup()
+        start = time.perf_counter()
+        scores = self._score(query_bundle.query_str, nodes)
+        for node, score in zip(nodes, scores):
+            node.score = score
+        reranked = sorted(nodes, key=lambda n: n.score, reverse=True)[: self.top_n]
+
+        self._latencies.append(time.perf_counter() - start)
+        report = self.latency_report()
+        logging.info(
+            f"Reranked {len(nodes)} nodes in {self._latencies[-1] * 1000:.1f}ms "
+            f"(p50 {report['p50_ms']:.1f}ms, p95 {report['p95_ms']:.1f}ms)"
+        )
+        return reranked
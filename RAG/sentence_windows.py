@@ -0,0 +1,211 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import SentenceWindowNodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import BaseNode, Document, NodeRelationship, NodeWithScore, QueryBundle
+
+from logger import logging
+
+DEFAULT_STORE_DIR = os.path.join(os.getcwd(), "storage")
+SENTENCE_STORE_NAME = "sentences.sqlite"
+SENTENCE_CACHE_DOCS = int(os.getenv("SENTENCE_CACHE_DOCS", 256))
+
+WINDOW_REF_KEY = "window_ref"
+
+
+class SentenceStore:
+    """Each document's sentence array, stored once and keyed by the hash of the sentences.
+
+    A store lives in the persist directory of the collection it serves, next to the nodes
+    that reference it. Content addressing makes identical documents share one entry;
+    entries are reference counted by document id and dropped with their last document.
+    """
+
+    def __init__(self, path, cache_docs=SENTENCE_CACHE_DOCS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.cache_docs = cache_docs
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sentences (key TEXT PRIMARY KEY, sentences TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs (doc_id TEXT NOT NULL, key TEXT NOT NULL, "
+            "PRIMARY KEY (doc_id, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS refs_key ON refs (key)")
+        self._conn.commit()
+
+    @staticmethod
+    def key_for(sentences):
+        hasher = hashlib.sha256()
+        for sentence in sentences:
+            hasher.update(sentence.encode("utf-8"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()[:32]
+
+    def put(self, sentences, doc_id):
+        key = self.key_for(sentences)
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO sentences (key, sentences) VALUES (?, ?)",
+                               (key, json.dumps(sentences)))
+            self._conn.execute("INSERT OR IGNORE INTO refs (doc_id, key) VALUES (?, ?)", (doc_id, key))
+            self._conn.commit()
+        return key
+
+    def remove_documents(self, doc_ids):
+        """Drops the documents' references and every entry no remaining document uses."""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return 0
+        with self._lock:
+            self._conn.executemany("DELETE FROM refs WHERE doc_id = ?", [(d,) for d in doc_ids])
+            orphans = [row[0] for row in self._conn.execute(
+                "SELECT key FROM sentences WHERE key NOT IN (SELECT key FROM refs)")]
+            self._conn.executemany("DELETE FROM sentences WHERE key = ?", [(k,) for k in orphans])
+            self._conn.commit()
+            for key in orphans:
+                self._cache.pop(key, None)
+        return len(orphans)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            row = self._conn.execute("SELECT sentences FROM sentences WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            sentences = json.loads(row[0])
+            self._cache[key] = sentences
+            while len(self._cache) > self.cache_docs:
+                self._cache.popitem(last=False)
+            return sentences
+
+    def window(self, window_ref):
+        """Rebuilds the window text of a (key, start, end) reference."""
+        key, start, end = window_ref
+        sentences = self.get(key)
+        if sentences is None:
+            return None
+        return " ".join(sentences[start:end])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            self._cache.clear()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def sentence_store_path(persist_dir=None):
+    return os.path.abspath(os.path.join(persist_dir or DEFAULT_STORE_DIR, SENTENCE_STORE_NAME))
+
+
+def get_sentence_store(persist_dir=None):
+    """The SentenceStore of the collection persisted in persist_dir, opened once per process."""
+    path = sentence_store_path(persist_dir)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SentenceStore(path)
+        return _stores[path]
+
+
+def close_sentence_store(persist_dir=None):
+    """Closes the collection's store, e.g. before its directory is deleted."""
+    path = sentence_store_path(persist_dir)
+    with _stores_lock:
+        store = _stores.pop(path, None)
+    if store is not None:
+        store.close()
+
+
+class CompactSentenceWindowNodeParser(SentenceWindowNodeParser):
+    """Sentence window parser that keeps windows out of node metadata.
+
+    The stock parser copies the whole window and the original sentence into every
+    node, so each sentence is stored about 2 * window_size + 2 times. Here the
+    document's sentences are written once to the SentenceStore and a node only keeps
+    a (key, start, end) reference that WindowReplacementPostProcessor resolves at
+    query time. The metadata copies in previous/next relationships are dropped too.
+    store_dir is the persist directory of the collection the nodes are indexed into.
+    """
+
+    store_dir: Optional[str] = Field(default=None, description="Persist directory of the sentence store.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CompactSentenceWindowNodeParser"
+
+    def build_window_nodes_from_documents(self, documents: Sequence[Document]) -> List[BaseNode]:
+        store = get_sentence_store(self.store_dir)
+        all_nodes: List[BaseNode] = []
+        for doc in documents:
+            text_splits = self.sentence_splitter(doc.text)
+            nodes = build_nodes_from_splits(text_splits, doc, id_func=self.id_func)
+            key = store.put([n.text for n in nodes], doc.id_)
+
+            for i, node in enumerate(nodes):
+                start, end = max(0, i - self.window_size), min(i + self.window_size + 1, len(nodes))
+                node.metadata[WINDOW_REF_KEY] = [key, start, end]
+                node.excluded_embed_metadata_keys.append(WINDOW_REF_KEY)
+                node.excluded_llm_metadata_keys.append(WINDOW_REF_KEY)
+
+            all_nodes.extend(nodes)
+        return all_nodes
+
+    def _postprocess_parsed_nodes(self, nodes, parent_doc_map):
+        nodes = super()._postprocess_parsed_nodes(nodes, parent_doc_map)
+        for node in nodes:
+            for relationship in (NodeRelationship.PREVIOUS, NodeRelationship.NEXT):
+                if relationship in node.relationships:
+                    node.relationships[relationship].metadata = {}
+        return nodes
+
+
+class WindowReplacementPostProcessor(BaseNodePostprocessor):
+    """Replaces each node's sentence with its surrounding window before synthesis.
+
+    Works with compact nodes (window_ref) and with nodes from the stock parser that
+    carry the window text in their metadata.
+    """
+
+    target_metadata_key: str = Field(default="window")
+    store_dir: Optional[str] = Field(default=None, description="Persist directory of the sentence store.")
+
+    _store = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "WindowReplacementPostProcessor"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if self._store is None:
+            self._store = get_sentence_store(self.store_dir)
+        for n in nodes:
+            window_ref = n.node.metadata.get(WINDOW_REF_KEY)
+            window = self._store.window(window_ref) if window_ref else None
+            if window is None:
+                window = n.node.metadata.get(self.target_metadata_key)
+            if window is None and window_ref:
+                logging.warning(f"Sentence window {window_ref[0]} is missing, keeping the sentence")
+            if window is not None:
+                n.node.set_content(window)
+        return nodes
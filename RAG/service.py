@@ -0,0 +1,241 @@
+import os
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+import RAG.indexing as indexing
+import RAG.model_api as model_api
+import RAG.data_ingestion as data_ingest
+from RAG.index_manager import IndexManager, collection_dir, load_ingest_state, storage_lock
+from RAG import jobs, tracing
+from RAG.ingest_profiler import profiling_run
+from logger import logging
+
+DEFAULT_MODEL = os.getenv("RAG_DEFAULT_MODEL", "qwen/qwen3-32b")
+
+
+class QueryRequest(BaseModel):
+    question: str
+    model: str = DEFAULT_MODEL
+    stream: bool = False
+    collection: Optional[str] = None
+
+
+class Source(BaseModel):
+    file_name: Optional[str] = None
+    file_path: Optional[str] = None
+    score: Optional[float] = None
+    text: str
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    sources: List[Source]
+
+
+class IngestRequest(BaseModel):
+    directory: str
+    collection: Optional[str] = None
+
+
+class IngestResponse(BaseModel):
+    summary: str
+    index_version: int
+
+
+class JobRequest(BaseModel):
+    directory: str
+    collection: Optional[str] = None
+
+
+# Requests only read the states held by the manager. Ingestion builds a new IndexState
+# for the collection and swaps it in.
+manager = IndexManager()
+ingest_lock = asyncio.Lock()
+
+
+def default_llm():
+    return model_api.load_model(DEFAULT_MODEL)
+
+
+def _load_collection(collection):
+    state = manager.get(collection, default_llm())
+    logging.info(f"Service loaded collection {collection or 'default'} "
+                 f"at index version {state.get('index_version')}")
+    return state
+
+
+def _new_state(collection):
+    return load_ingest_state(collection, default_llm())
+
+
+def _sync_directory(directory, collection):
+    with storage_lock(collection_dir(collection)):
+        ingest_state = _new_state(collection)
+        plan = indexing.sync_directory(directory, state=ingest_state)
+    manager.put(collection, ingest_state)
+    return plan
+
+
+def _run_job(job, listener):
+    collection = job["collection"] or None
+    with storage_lock(collection_dir(collection)):
+        ingest_state = _new_state(collection)
+        plan = indexing.sync_directory(job["directory"], state=ingest_state,
+                                       batch_files=jobs.JOB_CHECKPOINT_FILES, listener=listener)
+    manager.put(collection, ingest_state)
+    return plan
+
+
+job_queue = jobs.JobQueue(runner=_run_job)
+
+
+def _ingest_dir(temp_dir, collection):
+    with profiling_run("upload"):
+        with storage_lock(collection_dir(collection)):
+            ingest_state = _new_state(collection)
+            documents = indexing.create_or_update_retriever(data_ingest.iter_pipeline(temp_dir),
+                                                            state=ingest_state)
+    manager.put(collection, ingest_state)
+    return documents
+
+
+@asynccontextmanager
+async def lifespan(app):
+    import RAG.query_eng as qe
+
+    await run_in_threadpool(_load_collection, None)
+    await run_in_threadpool(qe.load_reranker)
+    job_queue.start()
+    yield
+
+
+app = FastAPI(title="Green Horizon RAG", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "index_version": indexing.get_index_version(),
+        "resident_mb": round(manager.resident_bytes() / 1e6, 1),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage p50/p95 latency over the recent queries of this process."""
+    return tracing.stage_stats()
+
+
+@app.get("/traces")
+async def traces(limit: int = 20):
+    return tracing.recent_traces(limit)
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query(request: QueryRequest):
+    import RAG.query_eng as qe
+
+    state = await run_in_threadpool(_load_collection, request.collection)
+    if state.get("fusion_retriever") is None:
+        raise HTTPException(status_code=409, detail="No documents have been ingested yet.")
+    llm = model_api.load_model(request.model)
+
+    if request.stream:
+        return StreamingResponse(
+            qe.astream_answer(request.question, llm, state=state),
+            media_type="text/plain; charset=utf-8"
+        )
+
+    response = await qe.rag_pipeline(request.question, llm, state=state)
+    stripper = qe.ThinkStripper()
+    answer = (stripper.feed(response.response or "") + stripper.flush()).strip()
+    sources = [
+        Source(file_name=n.node.metadata.get("file_name"),
+               file_path=n.node.metadata.get("file_path"),
+               score=n.score,
+               text=n.node.get_content())
+        for n in response.source_nodes
+    ]
+    return QueryResponse(answer=answer, sources=sources)
+
+
+@app.post("/ingest", response_model=IngestResponse)
+async def ingest(request: IngestRequest):
+    if not os.path.isdir(request.directory):
+        raise HTTPException(status_code=400, detail=f"Not a directory: {request.directory}")
+    async with ingest_lock:
+        plan = await run_in_threadpool(_sync_directory, request.directory, request.collection)
+    return IngestResponse(summary=plan.summary(), 
+                          index_version=indexing.get_index_version(collection_dir(request.collection)))
+
+
+@app.post("/ingest/files", response_model=IngestResponse)
+async def ingest_files(files: List[UploadFile] = File(...), collection: Optional[str] = None):
+    async with ingest_lock:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for upload in files:
+                with open(os.path.join(temp_dir, os.path.basename(upload.filename)), "wb") as f:
+                    f.write(await upload.read())
+            documents = await run_in_threadpool(_ingest_dir, temp_dir, collection)
+    return IngestResponse(summary=f"{len(files)} files, {documents} documents",
+                          index_version=indexing.get_index_version(collection_dir(collection)))
+
+
+@app.post("/jobs")
+async def submit_job(request: JobRequest):
+    """Queues a background sync of a directory; poll GET /jobs/{id} for per-file progress."""
+    if not os.path.isdir(request.directory):
+        raise HTTPException(status_code=400, detail=f"Not a directory: {request.directory}")
+    job_id = await run_in_threadpool(job_queue.submit, request.directory, request.collection)
+    return await run_in_threadpool(job_queue.get, job_id)
+
+
+@app.get("/jobs")
+async def list_jobs(collection: Optional[str] = None, limit: int = 20):
+    return await run_in_threadpool(job_queue.list, collection, limit)
+
+
+def _job_or_404(job):
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, files: int = 0):
+    job = _job_or_404(await run_in_threadpool(job_queue.get, job_id))
+    if files:
+        job["recent_files"] = await run_in_threadpool(job_queue.store.files, job_id, None, files)
+    return job
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    return _job_or_404(await run_in_threadpool(job_queue.cancel, job_id))
+
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    return _job_or_404(await run_in_threadpool(job_queue.resume, job_id))
+
+
+def _delete_collection(collection):
+    with storage_lock(collection_dir(collection)):
+        manager.delete(collection)
+
+
+@app.delete("/collections/{collection}")
+async def delete_collection(collection: str):
+    """Deletes a collection's index; refused while one of its jobs is queued or running."""
+    if collection in await run_in_threadpool(job_queue.store.active_collections):
+        raise HTTPException(status_code=409, detail="Collection has active jobs")
+    await run_in_threadpool(_delete_collection, collection)
+    return {"deleted": collection}
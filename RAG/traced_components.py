@@ -0,0 +1,52 @@
+import asyncio
+from typing import List, Sequence
+
+from llama_index.core.response_synthesizers import CompactAndRefine
+from llama_index.core.retrievers import QueryFusionRetriever
+from llama_index.core.schema import QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+from RAG.tracing import trace_span
+
+
+def count_tokens(text):
+    """Approximate token count with llama_index's default tokenizer."""
+    return len(get_tokenizer()(text))
+
+
+class TracedQueryFusionRetriever(QueryFusionRetriever):
+    """QueryFusionRetriever with spans for query generation and every sub-retriever call."""
+
+    async def _aget_queries(self, original_query: str) -> List[QueryBundle]:
+        with trace_span("retrieve.generate_queries") as span:
+            queries = await super()._aget_queries(original_query)
+            span["queries"] = len(queries)
+        return queries
+
+    async def _run_async_queries(self, queries):
+        async def timed(retriever, query, query_index):
+            name = f"retrieve.{type(retriever).__name__}"
+            with trace_span(name, query=query_index) as span:
+                nodes = await retriever.aretrieve(query)
+                span["nodes"] = len(nodes)
+            return nodes
+
+        tasks, task_queries = [], []
+        for query_index, query in enumerate(queries):
+            for i, retriever in enumerate(self._retrievers):
+                tasks.append(timed(retriever, query, query_index))
+                task_queries.append((query.query_str, i))
+
+        task_results = await asyncio.gather(*tasks)
+        return dict(zip(task_queries, task_results))
+
+
+class TracedCompactAndRefine(CompactAndRefine):
+    """CompactAndRefine that records prompt compaction time and context size."""
+
+    def _make_compact_text_chunks(self, query_str: str, text_chunks: Sequence[str]) -> List[str]:
+        with trace_span("synthesize.compact", chunks_in=len(text_chunks)) as span:
+            compact = super()._make_compact_text_chunks(query_str, text_chunks)
+            span["chunks_out"] = len(compact)
+            span["context_tokens"] = sum(count_tokens(chunk) for chunk in compact)
+        return compact
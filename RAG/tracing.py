@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from logger import logging
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(os.getcwd(), "logs", "traces.jsonl"))
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", 500))
+
+_current_trace = ContextVar("current_trace", default=None)
+_current_span = ContextVar("current_span", default=None)
+
+_recent = deque(maxlen=TRACE_BUFFER)
+_write_lock = threading.Lock()
+
+
+class Trace:
+    """Timed spans of one query. Spans are flat dicts with a parent name and offsets in ms."""
+
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Times the block. The yielded dict takes attributes known only at the end."""
+        span = {"name": name, "parent": _current_span.get(),
+                "start_ms": self.elapsed_ms(), **attrs}
+        token = _current_span.set(name)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["duration_ms"] = (time.perf_counter() - start) * 1000
+            _current_span.reset(token)
+            self.spans.append(span)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def add_span(self, name, start_ms, duration_ms, parent=None, **attrs):
+        """Records a span timed by the caller, e.g. one that spans the yields of a generator."""
+        self.spans.append({"name": name, "parent": parent, "start_ms": start_ms,
+                           "duration_ms": duration_ms, **attrs})
+
+    @contextmanager
+    def active(self):
+        """Makes this the trace that trace_span() records into, e.g. inside llama_index components."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self, **attrs):
+        if self.duration_ms is not None:
+            return self
+        self.attrs.update(attrs)
+        self.duration_ms = self.elapsed_ms()
+        if TRACE_ENABLED:
+            export(self)
+        return self
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started": self.started,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+
+
+def start_trace(name, **attrs):
+    return Trace(name, **attrs)
+
+
+@contextmanager
+def trace_span(name, **attrs):
+    """A span in the active trace, or a no-op when there is none."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield dict(attrs)
+        return
+    with trace.span(name, **attrs) as span:
+        yield span
+
+
+def export(trace):
+    record = trace.to_dict()
+    _recent.append(record)
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(TRACE_PATH), exist_ok=True)
+            with open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        logging.warning(f"Could not write trace {trace.trace_id}: {e}")
+
+
+def recent_traces(limit=20):
+    return list(_recent)[-limit:]
+
+
+def stage_stats(traces=None):
+    """p50/p95 per span name (and for whole traces) over the recent traces of this process."""
+    import numpy as np
+
+    traces = list(_recent) if traces is None else traces
+    durations = {}
+    for trace in traces:
+        durations.setdefault(trace["name"], []).append(trace["duration_ms"])
+        for span in trace["spans"]:
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+
+    stats = {}
+    for name, values in durations.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        stats[name] = {"count": len(values), "p50_ms": float(p50), "p95_ms": float(p95)}
+    return stats
@@ -1,10 +1,29 @@
+import os
 import streamlit as st
 import uuid
 import time # Import time for a quick spinner demo
 import hashlib
+import nest_asyncio
+from RAG import hooks
 import RAG.indexing as indexing
 import RAG.model_api as model_api
 import RAG.data_ingestion as data_ingest
+from RAG.client import get_client
+from RAG.chat_store import chat_collection, load_chat_store
+from RAG.index_manager import collection_dir, load_index_manager, load_ingest_state, storage_lock
+from RAG.jobs import ACTIVE, load_job_queue
+from RAG import tracing
+from RAG.ingest_profiler import profiling_run
+
+# The RAG package defaults to a process-wide cache and log-file progress; the app uses Streamlit's.
+hooks.use_streamlit()
+nest_asyncio.apply()
+
+# When RAG_SERVICE_URL is set, retrieval and ingestion run in RAG.service instead of here.
+service_client = get_client()
+
+SHOW_LATENCY_PANEL = os.getenv("SHOW_LATENCY_PANEL", "0") == "1"
+JOB_REFRESH_SECONDS = 2
 
 def get_file_hash(file_object):
     file_bytes = file_object.read()
@@ -13,11 +32,121 @@ def get_file_hash(file_object):
     file_object.seek(0) 
     return hasher.hexdigest()
 
+def show_latency_panel():
+    """Sidebar breakdown of the last query and per-stage p50/p95."""
+    try:
+        if service_client is not None:
+            traces, stats = service_client.traces(limit=1), service_client.metrics()
+        else:
+            traces, stats = tracing.recent_traces(1), tracing.stage_stats()
+    except Exception as e:
+        st.caption(f"Latency data unavailable: {e}")
+        return
+
+    with st.expander("⏱️ Latency", expanded=False):
+        if not traces:
+            st.caption("No queries yet.")
+            return
+        last = traces[-1]
+        st.markdown(f"**Last query:** {last['duration_ms']:.0f} ms")
+        st.dataframe([
+            {"stage": span["name"], "start ms": round(span["start_ms"]), "ms": round(span["duration_ms"])}
+            for span in last["spans"]
+        ], hide_index=True, use_container_width=True)
+        st.markdown("**p50 / p95**")
+        st.dataframe([
+            {"stage": name, "n": s["count"], "p50 ms": round(s["p50_ms"]), "p95 ms": round(s["p95_ms"])}
+            for name, s in stats.items()
+        ], hide_index=True, use_container_width=True)
+
+def submit_directory_job(dir_path, collection):
+    if service_client is not None:
+        return service_client.submit_job(dir_path, collection=collection)["id"]
+    return load_job_queue().submit(dir_path, collection=collection)
+
+def list_jobs(collection, limit=3):
+    if service_client is not None:
+        return service_client.jobs(collection=collection, limit=limit)
+    return load_job_queue().list(collection, limit)
+
+def cancel_job(job_id):
+    if service_client is not None:
+        service_client.cancel_job(job_id)
+    else:
+        load_job_queue().cancel(job_id)
+
+def resume_job(job_id):
+    if service_client is not None:
+        service_client.resume_job(job_id)
+    else:
+        load_job_queue().resume(job_id)
+
+def auto_refresh(func):
+    """Reruns func on its own every few seconds where Streamlit supports fragments."""
+    fragment = getattr(st, "fragment", None)
+    return fragment(run_every=JOB_REFRESH_SECONDS)(func) if fragment else func
+
+def show_job(job, key_prefix, label=None):
+    total, done = job["total"], job["done"]
+    fraction = done / total if total else float(job["status"] == "completed")
+    name = label or os.path.basename(job["directory"].rstrip(os.sep)) or job["directory"]
+    st.progress(fraction, text=f"{name}: {job['status']} ({done}/{total} files)")
+    if job["status"] in ("queued", "running"):
+        st.button("Cancel", key=f"{key_prefix}_cancel_{job['id']}", on_click=cancel_job, args=(job["id"],))
+    elif job["status"] in ("cancelled", "failed"):
+        st.button("Resume", key=f"{key_prefix}_resume_{job['id']}", on_click=resume_job, args=(job["id"],))
+    if job.get("error"):
+        st.caption(f"❌ {job['error']}")
+
+@auto_refresh
+def show_jobs(collection):
+    """Per-file progress of the chat's recent directory jobs, with cancel and resume."""
+    # Jobs of the shared storage/ index are stored under the empty collection name.
+    for job in list_jobs(collection or ""):
+        show_job(job, "chat")
+
+@auto_refresh
+def show_active_jobs():
+    """Every queued or running directory job, whichever chat started it."""
+    active = [job for job in list_jobs(None, limit=20) if job["status"] in ACTIVE]
+    if not active:
+        return
+    titles = {chat_collection(chat) or "": chat["title"] for chat in st.session_state.chats}
+    st.header("Ingestion")
+    for job in active:
+        name = os.path.basename(job["directory"].rstrip(os.sep)) or job["directory"]
+        chat_title = titles.get(job["collection"] or "")
+        show_job(job, "active", label=f"{chat_title} · {name}" if chat_title else name)
+
 def update_model():
     model_name = st.session_state.selected_model
     st.session_state.model_llm = model_api.load_model(model_name=model_name)
     st.toast(f"Switched model to {model_name}", icon="🤖")
 
+def get_chat_index(chat):
+    """Index of the chat's own documents, loaded on demand by the shared index manager."""
+    return load_index_manager().get(chat_collection(chat), st.session_state.model_llm)
+
+def save_chat(chat):
+    load_chat_store().save(chat)
+
+def delete_chat(chat):
+    """Deletes a chat and the collection it owns; the shared storage/ index is never removed.
+
+    Returns False, deleting nothing, while a job is still writing to the collection.
+    """
+    collection = chat_collection(chat)
+    if any(job["status"] in ACTIVE for job in list_jobs(collection or "", limit=20)):
+        return False
+    if collection is not None:
+        if service_client is not None:
+            service_client.delete_collection(collection)
+        else:
+            with storage_lock(collection_dir(collection)):
+                load_index_manager().delete(collection)
+    load_chat_store().delete(chat["id"])
+    return True
+
 def process_uploaded_files(uploader_key, chat_to_update):
     docs = st.session_state[uploader_key]
     if not docs:
@@ -30,6 +159,7 @@ def process_uploaded_files(uploader_key, chat_to_update):
     
     all_unique_names_set = existing_names_set.union(new_names_set)
     chat_to_update["doc_names"] = list(all_unique_names_set)
+    save_chat(chat_to_update)
 
     # 2. Show a toast
     if newly_added_count > 0:
@@ -72,15 +202,14 @@ def main():
 
     # --- Session State Initialization ---
     if "chats" not in st.session_state:
-        st.session_state.chats = []
+        # Chats are saved with their collections, so they survive a refresh or restart.
+        st.session_state.chats = load_chat_store().load()
     if "active_chat_id" not in st.session_state:
-        st.session_state.active_chat_id = None
+        st.session_state.active_chat_id = st.session_state.chats[0]["id"] if st.session_state.chats else None
     if "selected_model" not in st.session_state:
         st.session_state.selected_model = "qwen/qwen3-32b" # Default model
     if "model_llm" not in st.session_state:
         st.session_state.model_llm = model_api.load_model(model_name=st.session_state.selected_model )
-    if "fusion_retriever" not in st.session_state:
-        st.session_state.fusion_retriever = None
     if 'processing_status' not in st.session_state:
         st.session_state.processing_status = 'idle'  # idle, running, completed, error
         st.session_state.processed_documents = None
@@ -88,7 +217,7 @@ def main():
         st.session_state.processing_thread = None
 
     # --- Helper Function: Create New Chat ---
-    def create_new_chat():
+    def create_new_chat(shared_index=False):
         chat_id = str(uuid.uuid4())
         new_chat = {
             "id": chat_id,
@@ -98,8 +227,13 @@ def main():
             "messages": [], 
             "model": st.session_state.selected_model 
         }
+        if shared_index:
+            # Searches the index in storage/ instead of a collection of its own.
+            new_chat["collection"] = None
+            new_chat["title"] = "Saved Index"
         st.session_state.chats.insert(0, new_chat) 
         st.session_state.active_chat_id = chat_id
+        save_chat(new_chat)
 
     # --- Helper Function: Get Active Chat ---
     def get_active_chat():
@@ -128,16 +262,38 @@ def main():
                 st.session_state.active_chat_id = chat["id"]
                 st.rerun() 
 
+        active = get_active_chat()
+        if active and st.button("Delete Chat 🗑️", key="sidebar_delete_chat", use_container_width=True):
+            if delete_chat(active):
+                st.session_state.chats.remove(active)
+                st.session_state.active_chat_id = (st.session_state.chats[0]["id"]
+                                                   if st.session_state.chats else None)
+                st.rerun()
+            else:
+                st.warning("Cancel or finish this chat's ingestion jobs before deleting it.")
+
+        show_active_jobs()
+
+        if SHOW_LATENCY_PANEL:
+            show_latency_panel()
+
     # --- Main Application ---
     st.title("🍃 Green Horizon Genie")
     st.divider()
 
     # --- 3. Chat Area ---
     if not st.session_state.active_chat_id and not st.session_state.chats:
-        create_new_chat() 
+        # An index persisted before chats had their own collections stays reachable.
+        create_new_chat(shared_index=indexing.has_persisted_index()) 
 
     active_chat = get_active_chat()
 
+    if (active_chat and service_client is None 
+            and st.session_state.get("loaded_collection", "") != chat_collection(active_chat)):
+        with st.spinner("Loading saved index..."):
+            get_chat_index(active_chat)
+        st.session_state.loaded_collection = chat_collection(active_chat)
+
     if active_chat:
         # --- Chat Interface ---
         st.header(f"{active_chat['title']}")
@@ -163,23 +319,31 @@ def main():
         
         if user_question := st.chat_input("Ask your question..."):
             
-            data_source_exists = active_chat["doc_names"] or active_chat.get("directory_path")
+            # A queued directory or upload names a data source before its first batch is published.
+            data_source_added = active_chat["doc_names"] or active_chat.get("directory_path")
+            data_source_exists = (service_client is not None
+                                  or get_chat_index(active_chat).get("fusion_retriever") is not None)
             
-            if not data_source_exists:
+            if not data_source_exists and data_source_added:
+                st.info("Indexing is in progress and no results are published yet; ask again in a moment. ⏳")
+            elif not data_source_exists:
                 st.warning("Please add a data source first using the 'Add Data 📤' button! 📑")
             else:
                 active_chat["messages"].append({"role": "user", "content": user_question})
                 
-                with st.spinner(f"Thinking... ☕"):
-                    time.sleep(1) 
-                    import RAG.query_eng as qe
-                    import asyncio
-                    response = asyncio.run(
-                                        qe.rag_pipeline(user_question, st.session_state.model_llm)
-                                    )
-                    import re
-                    real_answer = re.sub(r"<think>.*?</think>", "", response.response, flags=re.DOTALL).strip()
-                    #real_source = "Source from RAG pipeline."
+                with st.chat_message("user"):
+                    st.markdown(user_question)
+
+                with st.chat_message("assistant"):
+                    if service_client is not None:
+                        answer_stream = service_client.stream_answer(user_question, 
+                                                                     st.session_state.selected_model,
+                                                                     collection=chat_collection(active_chat))
+                    else:
+                        import RAG.query_eng as qe
+                        answer_stream = qe.astream_answer(user_question, st.session_state.model_llm,
+                                                          state=get_chat_index(active_chat))
+                    real_answer = st.write_stream(answer_stream)
                 
                 active_chat["messages"].append({
                     "role": "assistant",
@@ -189,6 +353,7 @@ def main():
                 
                 if len(active_chat["messages"]) == 2: 
                     active_chat["title"] = user_question[:50] + "..."
+                save_chat(active_chat)
                 
                 st.rerun()
 
@@ -238,7 +403,12 @@ def main():
                                             active_chat["doc_data"][doc_hash] = doc.name
                                             new_files_to_process.append(doc)
 
-                                    if new_files_to_process:
+                                    if new_files_to_process and service_client is not None:
+                                        service_client.ingest_files(
+                                            [(d.name, d.getvalue()) for d in new_files_to_process],
+                                            collection=chat_collection(active_chat)
+                                        )
+                                    elif new_files_to_process:
                                         loaded_documents = []
                                         import tempfile
                                         import os
@@ -253,11 +423,17 @@ def main():
                                                 file_paths.append(path)
 
                                             
-                                            loaded_documents = data_ingest.process_pipeline(temp_dir)
-                                            indexing.create_or_update_retriever(loaded_documents)
+                                            # A directory job for this chat may be writing the same collection.
+                                            collection = chat_collection(active_chat)
+                                            with profiling_run("upload"), storage_lock(collection_dir(collection)):
+                                                ingest_state = load_ingest_state(collection, st.session_state.model_llm)
+                                                indexing.create_or_update_retriever(data_ingest.iter_pipeline(temp_dir), 
+                                                                                    state=ingest_state)
+                                            load_index_manager().put(collection, ingest_state)
 
                                 st.toast("Files Added!")
-                                active_chat["doc_names"].extend(new_files_to_process)
+                                active_chat["doc_names"].extend(d.name for d in new_files_to_process)
+                                save_chat(active_chat)
 
                                 time.sleep(0.5)
                                 st.rerun()
@@ -273,14 +449,15 @@ def main():
                         )
                         if st.button("Load Directory"):
                             if dir_path:
-                                with st.spinner(f"Processing directory..."):
-                                    loaded_documents = data_ingest.process_pipeline(dir_path)
-                                    indexing.create_or_update_retriever(loaded_documents)
+                                # Runs in the background; progress is shown below and survives a page refresh.
+                                submit_directory_job(dir_path, chat_collection(active_chat))
                                 active_chat["directory_path"] = dir_path
-                                st.success(f"Connected to directory.")
+                                save_chat(active_chat)
+                                st.toast("Directory queued for ingestion", icon="📂")
                                 st.rerun()
                             else:
                                 st.warning("Please enter a path.")
+                        show_jobs(chat_collection(active_chat))
 
     else:
         if st.session_state.chats:
@@ -0,0 +1,158 @@
+"""Compares the vector store backends with exact search on the persisted corpus.
+
+Uses the embeddings of an existing index (storage/ by default). Queries are stored
+vectors with noise added, so no embedding server is needed. Reports recall@k against
+exact cosine search, per-query latency and embedding memory for the simple vector
+store that VectorStoreIndex uses by default, the NumPy store in each dtype and HNSW
+at several ef_search values:
+
+    python benchmarks/ann_vs_exact.py --persist-dir storage --ef 16 32 64 128
+    python benchmarks/ann_vs_exact.py --synthetic 200000 --dim 1024
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from RAG.hnsw_store import HnswVectorStore
+from RAG.numpy_store import NumpyVectorStore
+
+
+def load_corpus(persist_dir):
+    simple_path = os.path.join(persist_dir, "default__vector_store.json")
+    if os.path.exists(simple_path):
+        data = SimpleVectorStore.from_persist_path(simple_path).data
+        node_ids = list(data.embedding_dict)
+        return node_ids, np.asarray([data.embedding_dict[i] for i in node_ids], dtype=np.float32)
+    if HnswVectorStore.exists(persist_dir):
+        store = HnswVectorStore.from_persist_dir(persist_dir)
+        node_ids = list(store._labels)
+        labels = [store._labels[i] for i in node_ids]
+        return node_ids, np.asarray(store.client.get_items(labels), dtype=np.float32)
+    if NumpyVectorStore.exists(persist_dir):
+        store = NumpyVectorStore.from_persist_dir(persist_dir)
+        vectors = np.asarray(store.client[:len(store._ids)], dtype=np.float32)
+        return store._ids, vectors * np.asarray(store._scales)[:, None]
+    raise SystemExit(f"No persisted vector store in {persist_dir}; use --synthetic N")
+
+
+def synthetic_corpus(size, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    # Clustered vectors are closer to real sentence embeddings than uniform noise.
+    centers = rng.standard_normal((max(size // 200, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=size)] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    return [f"node-{i}" for i in range(size)], vectors
+
+
+def make_queries(vectors, count, noise, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(len(vectors), size=count)]
+    scale = noise * np.linalg.norm(picked, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return picked + scale * rng.standard_normal(picked.shape).astype(np.float32)
+
+
+def exact_top_k(vectors, queries, k):
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        scores = normed @ (query / np.linalg.norm(query))
+        top = np.argpartition(-scores, k)[:k]
+        results.append(set(top[np.argsort(-scores[top])].tolist()))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def simple_store_latency(node_ids, vectors, queries, k, limit):
+    store = SimpleVectorStore()
+    store.add([TextNode(id_=i, text="", embedding=v.tolist()) for i, v in zip(node_ids, vectors)])
+    latencies = []
+    for query in queries[:limit]:
+        start = time.perf_counter()
+        store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def evaluate(store, queries, truth, positions, k):
+    hits, latencies = 0, []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k))
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {positions[i] for i in result.ids})
+    return hits / (k * len(queries)), latencies
+
+
+def percentiles(latencies):
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    return f"p50 {p50:8.3f} ms  p95 {p95:8.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-dir", default=os.path.join(os.getcwd(), "storage"))
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random clustered vectors instead")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--numpy-dtypes", nargs="*", default=["float32", "float16", "int8"])
+    parser.add_argument("--simple-queries", type=int, default=20,
+                        help="queries to time on the simple store, which is slow on large corpora")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        node_ids, vectors = synthetic_corpus(args.synthetic, args.dim)
+    else:
+        node_ids, vectors = load_corpus(args.persist_dir)
+    queries = make_queries(vectors, args.queries, args.noise)
+    k = args.top_k
+    print(f"Corpus: {len(node_ids)} vectors of dim {vectors.shape[1]}, {len(queries)} queries, top {k}")
+
+    truth, exact_latencies = exact_top_k(vectors, queries, k)
+    print(f"{'exact numpy':<22} recall 1.000  {percentiles(exact_latencies)}")
+    if args.simple_queries:
+        latencies = simple_store_latency(node_ids, vectors, queries, k, args.simple_queries)
+        # Python lists of floats: an 8 byte pointer and a 24 byte float object per value.
+        simple_mb = vectors.size * 32 / 1e6
+        print(f"{'simple vector store':<22} recall 1.000  {percentiles(latencies)}  ~{simple_mb:.1f} MB")
+
+    positions = {node_id: i for i, node_id in enumerate(node_ids)}
+    for dtype in args.numpy_dtypes:
+        store = NumpyVectorStore(dtype=dtype)
+        store.add_embeddings(node_ids, vectors, [None] * len(node_ids))
+        recall, latencies = evaluate(store, queries, truth, positions, k)
+        matrix_mb = store.client[:len(node_ids)].nbytes / 1e6
+        print(f"{'numpy ' + dtype:<22} recall {recall:.3f}  {percentiles(latencies)}  {matrix_mb:.1f} MB")
+
+    store = HnswVectorStore(m=args.m, ef_construction=args.ef_construction)
+    start = time.perf_counter()
+    store.add_embeddings(node_ids, vectors, [None] * len(node_ids))
+    build_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        store.persist(os.path.join(tmp, "default__vector_store.json"))
+        index_mb = os.path.getsize(os.path.join(tmp, "hnsw_index.bin")) / 1e6
+    print(f"HNSW build {build_seconds:.2f}s (M={args.m}, ef_construction={args.ef_construction}), "
+          f"index file {index_mb:.1f} MB")
+
+    for ef in args.ef:
+        store.ef_search = ef
+        recall, latencies = evaluate(store, queries, truth, positions, k)
+        print(f"{'hnsw ef_search=' + str(ef):<22} recall {recall:.3f}  {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""End-to-end benchmark of parsing, indexing, retrieval and full queries, fully offline.
+
+Builds a seeded synthetic corpus (or uses --fixture-dir). Embeddings, the LLM and the
+reranker are the deterministic stand-ins from RAG/offline_models.py. Everything runs in a
+scratch working directory, so caches, storage and logs start cold. Reports throughput,
+latency percentiles, per-stage query latency and peak RSS. Results are written as JSON
+to benchmarks/results/ so revisions can be compared:
+
+    python benchmarks/end_to_end.py --docs 500 --queries 100
+    python benchmarks/end_to_end.py --compare benchmarks/results/<baseline>.json
+
+Docling conversion needs downloaded models, so it is skipped unless --docling is given;
+plain text files are parsed with llama_index's default readers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+sys.path.insert(0, REPO_ROOT)
+
+
+#----------Corpus--------------
+def make_vocabulary(rng, size):
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qui", "dor", "len", "mar"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def synthetic_corpus(corpus_dir, docs, sentences, seed):
+    """Writes docs text files; each has its own topic words mixed into common words."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 5000)
+    common = vocabulary[:500]
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {}
+    for i in range(docs):
+        topic = rng.sample(vocabulary[500:], 20)
+        lines = []
+        for _ in range(sentences):
+            words = [rng.choice(topic) if rng.random() < 0.4 else rng.choice(common)
+                     for _ in range(rng.randint(8, 16))]
+            lines.append(" ".join(words).capitalize() + ".")
+        name = f"doc_{i:05d}.txt"
+        with open(os.path.join(corpus_dir, name), "w", encoding="utf-8") as f:
+            f.write(" ".join(lines))
+        corpus[name] = lines
+    return corpus
+
+def fixture_corpus(fixture_dir, corpus_dir):
+    shutil.copytree(fixture_dir, corpus_dir)
+    return {}
+
+def make_queries(corpus, count, seed):
+    """Picks words from a random sentence; the document it came from is the expected hit."""
+    rng = random.Random(seed + 1)
+    names = sorted(corpus)
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        words = rng.choice(corpus[name]).rstrip(".").lower().split()
+        queries.append((" ".join(rng.sample(words, min(5, len(words)))), name))
+    return queries
+
+
+#----------Measurements--------------
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def latency_stats(latencies):
+    values = np.array(latencies) * 1000
+    if not len(values):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "mean_ms": float(values.mean()), "p50_ms": float(p50),
+            "p95_ms": float(p95), "p99_ms": float(p99)}
+
+async def timed_queries(queries, run):
+    latencies, results = [], []
+    for query, _ in queries:
+        start = time.perf_counter()
+        results.append(await run(query))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+def hit_rate(queries, node_lists):
+    hits = sum(any(n.node.metadata.get("file_name") == expected for n in nodes)
+               for (_, expected), nodes in zip(queries, node_lists))
+    return hits / len(queries) if queries else 0.0
+
+
+def run_benchmark(args, workdir):
+    # Paths in the RAG package are relative to the working directory at import time.
+    os.chdir(workdir)
+    os.environ["EMBED_MODEL"] = "offline"
+    os.environ["RERANK_MODEL"] = "offline"
+    os.environ["VECTOR_STORE"] = args.vector_store
+
+    from RAG import hooks, tracing
+    import RAG.data_ingestion as data_ingest
+    import RAG.indexing as indexing
+    import RAG.model_api as model_api
+    import RAG.query_eng as qe
+    from RAG.ingest_profiler import peak_rss_mb, profiling_run
+
+    corpus_dir = os.path.join(workdir, "corpus")
+    if args.fixture_dir:
+        corpus = fixture_corpus(args.fixture_dir, corpus_dir)
+    else:
+        corpus = synthetic_corpus(corpus_dir, args.docs, args.sentences, args.seed)
+    corpus_bytes = sum(os.path.getsize(os.path.join(root, f))
+                       for root, _, files in os.walk(corpus_dir) for f in files)
+    results = {}
+
+    #----------Parse--------------
+    start = time.perf_counter()
+    if args.docling:
+        documents = data_ingest.process_pipeline(corpus_dir, workers=args.workers)
+    else:
+        documents = data_ingest.load_documents({}, input_dir=corpus_dir, workers=1)
+    seconds = time.perf_counter() - start
+    results["parse"] = {"documents": len(documents), "seconds": seconds,
+                        "docs_per_sec": len(documents) / seconds, "mb_per_sec": corpus_bytes / 1e6 / seconds,
+                        "peak_rss_mb": peak_rss_mb()}
+    print(f"✅ Parsed {len(documents)} documents in {seconds:.2f}s")
+
+    #----------Index--------------
+    llm = model_api.load_model("offline")
+    state = hooks.IndexState(persist_dir=os.path.join(workdir, "storage"), collection_id="benchmark",
+                             model_llm=llm)
+    start = time.perf_counter()
+    with profiling_run("benchmark") as profiler:
+        indexing.create_or_update_retriever(documents, state=state)
+    seconds = time.perf_counter() - start
+    nodes = len(state.vector_index.docstore.docs)
+    results["index"] = {"nodes": nodes, "seconds": seconds, "nodes_per_sec": nodes / seconds,
+                        "stages": profiler.report()["stages"], "peak_rss_mb": peak_rss_mb()}
+    print(f"✅ Indexed {nodes} nodes in {seconds:.2f}s")
+
+    #----------Retrieval and Query--------------
+    queries = make_queries(corpus, args.queries, args.seed) if corpus else \
+        [(f"query {i}", None) for i in range(args.queries)]
+
+    async def run_queries():
+        retrieval, retrieved = await timed_queries(
+            queries, lambda q: qe.retrieve_context(q, state=state))
+        cold, _ = await timed_queries(queries, lambda q: qe.rag_pipeline(q, llm, state=state))
+        cold_traces = tracing.recent_traces(len(queries))
+        warm, _ = await timed_queries(queries, lambda q: qe.rag_pipeline(q, llm, state=state))
+        return retrieval, retrieved, cold, cold_traces, warm
+
+    start = time.perf_counter()
+    retrieval, retrieved, cold, cold_traces, warm = asyncio.run(run_queries())
+    results["retrieval"] = {**latency_stats(retrieval), "qps": len(retrieval) / sum(retrieval),
+                            "hit_rate_at_5": hit_rate(queries, retrieved) if corpus else None}
+    results["query"] = {**latency_stats(cold), "qps": len(cold) / sum(cold),
+                        "cache_hits": sum(t["attrs"].get("cache_hit", False) for t in cold_traces),
+                        "stages": tracing.stage_stats(cold_traces)}
+    results["query_cached"] = {**latency_stats(warm), "qps": len(warm) / sum(warm)}
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(f"✅ Ran {3 * len(queries)} queries in {time.perf_counter() - start:.2f}s")
+    return results
+
+
+#----------Report--------------
+HEADLINE = [
+    ("parse", "docs_per_sec"), ("index", "nodes_per_sec"),
+    ("retrieval", "p50_ms"), ("retrieval", "p95_ms"), ("retrieval", "hit_rate_at_5"),
+    ("query", "p50_ms"), ("query", "p95_ms"), ("query_cached", "p50_ms"),
+]
+
+def headline(results):
+    values = {f"{phase}.{key}": results[phase].get(key) for phase, key in HEADLINE}
+    values["peak_rss_mb"] = results["peak_rss_mb"]
+    return values
+
+def print_report(record, baseline=None):
+    current = headline(record["results"])
+    previous = headline(baseline["results"]) if baseline else {}
+    print(f"\nRevision {record['revision'][:10]}"
+          + (f" vs {baseline['revision'][:10]}" if baseline else ""))
+    for name, value in current.items():
+        if value is None:
+            continue
+        line = f"  {name:<26} {value:12.3f}"
+        old = previous.get(name)
+        if old:
+            line += f"  {old:12.3f}  {100 * (value - old) / old:+7.1f}%"
+        print(line)
+    print("  Query stages (p50 / p95 ms):")
+    for name, stats in record["results"]["query"]["stages"].items():
+        print(f"    {name:<30} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--sentences", type=int, default=40, help="sentences per synthetic document")
+    parser.add_argument("--fixture-dir", help="benchmark a copy of this directory instead")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vector-store", default="numpy", choices=["numpy", "hnsw", "simple"])
+    parser.add_argument("--docling", action="store_true", help="parse with Docling (needs its models)")
+    parser.add_argument("--workers", type=int, default=1, help="Docling conversion workers")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<revision>_<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    cwd = os.getcwd()
+    try:
+        results = run_benchmark(args, workdir)
+    finally:
+        os.chdir(cwd)
+        if args.keep_workdir:
+            print(f"Working directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    record = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep_workdir")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{record['revision'][:10]}_{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(record, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measures the cold import time of the RAG package.
+
+Each module is imported in a fresh interpreter, so nothing is shared between runs.
+Fails when a module takes longer than the budget or pulls in a heavy dependency:
+
+    python benchmarks/import_time.py --budget 0.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "RAG",
+    "RAG.hooks",
+    "RAG.model_api",
+    "RAG.embed_model_api",
+    "RAG.indexing",
+    "RAG.query_eng",
+    "RAG.data_ingestion",
+]
+
+# Loaded only when a model, parser or UI is actually used.
+HEAVY_MODULES = [
+    "streamlit",
+    "llama_index.core",
+    "docling",
+    "torch",
+    "sentence_transformers",
+    "nest_asyncio",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module, repeat=3):
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return min(r["seconds"] for r in runs), runs[-1]["heavy"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_SECONDS", 0.5)))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        seconds, heavy = measure(module, args.repeat)
+        ok = seconds <= args.budget and not heavy
+        failed |= not ok
+        status = "✅" if ok else "❌"
+        extra = f"  pulls in {', '.join(heavy)}" if heavy else ""
+        print(f"{status} {module:<24} {seconds * 1000:7.1f} ms{extra}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import threading
+
+import pytest
+from llama_index.core.schema import TextNode
+
+import RAG.bm25_index as bm25_index
+from RAG.bm25_index import COMMIT_FILE, BM25Index
+
+
+def make_nodes(start, count):
+    return [TextNode(id_=f"n{i}", text=f"document {i} mentions keyword{i} and shared words")
+            for i in range(start, start + count)]
+
+
+def top_id(index, query):
+    results = index.search(query, top_k=1)
+    return results[0][0] if results else None
+
+
+def test_add_and_search():
+    index = BM25Index()
+    index.add_nodes(make_nodes(0, 10))
+    assert index.num_docs == 10
+    assert top_id(index, "keyword3") == "n3"
+    assert {node_id for node_id, _ in index.search("shared", top_k=20)} == {f"n{i}" for i in range(10)}
+
+
+def test_delete_hides_nodes():
+    index = BM25Index()
+    index.add_nodes(make_nodes(0, 10))
+    index.delete_nodes(["n3", "unknown"])
+    assert index.num_docs == 9
+    assert top_id(index, "keyword3") is None
+    assert "n3" not in {node_id for node_id, _ in index.search("shared", top_k=20)}
+
+
+def test_readding_a_node_replaces_it():
+    index = BM25Index()
+    index.add_nodes(make_nodes(0, 3))
+    index.add_nodes([TextNode(id_="n1", text="replacement text about zebras")])
+    assert index.num_docs == 3
+    assert top_id(index, "zebras") == "n1"
+    assert top_id(index, "keyword1") is None
+
+
+def test_merge_keeps_results(tmp_path):
+    index = BM25Index(persist_dir=str(tmp_path))
+    for start in range(0, 30, 5):
+        index.add_nodes(make_nodes(start, 5))
+    index.delete_nodes(["n7"])
+    before = index.search("shared keyword12", top_k=30)
+    index.merge_segments()
+    assert len(index.segments) == 1
+    assert index.search("shared keyword12", top_k=30) == before
+    assert BM25Index.load(str(tmp_path)).search("shared keyword12", top_k=30) == before
+
+
+def test_persisted_index_round_trips(tmp_path):
+    index = BM25Index(persist_dir=str(tmp_path))
+    index.add_nodes(make_nodes(0, 8))
+    index.add_nodes(make_nodes(8, 8))
+    index.delete_nodes(["n2"])
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.num_docs == 15
+    assert loaded.search("shared keyword9", top_k=15) == index.search("shared keyword9", top_k=15)
+
+
+def test_compaction_drops_deleted_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_index, "BM25_COMPACT_RATIO", 0.25)
+    index = BM25Index(persist_dir=str(tmp_path))
+    index.add_nodes(make_nodes(0, 20))
+    generation = index.generation
+    index.delete_nodes([f"n{i}" for i in range(6)])
+    assert index.generation != generation
+    assert not index.deleted
+    assert index.node_ids == [f"n{i}" for i in range(6, 20)]
+    assert not os.path.exists(tmp_path / generation)
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.node_ids == index.node_ids
+    assert top_id(loaded, "keyword15") == "n15"
+    assert top_id(loaded, "keyword2") is None
+
+
+def test_crash_tail_is_ignored(tmp_path):
+    index = BM25Index(persist_dir=str(tmp_path))
+    index.add_nodes(make_nodes(0, 5))
+    with open(tmp_path / index.generation / "docs.txt", "ab") as f:
+        f.write(b"half-written\n")
+    loaded = BM25Index.load(str(tmp_path), read_only=True)
+    assert loaded.node_ids == [f"n{i}" for i in range(5)]
+    # A writer truncates the tail before appending again.
+    writer = BM25Index.load(str(tmp_path))
+    writer.add_nodes(make_nodes(5, 1))
+    assert BM25Index.load(str(tmp_path)).node_ids == [f"n{i}" for i in range(6)]
+
+
+def test_read_only_index_never_writes(tmp_path):
+    BM25Index(persist_dir=str(tmp_path)).add_nodes(make_nodes(0, 5))
+    with open(tmp_path / COMMIT_FILE, "rb") as f:
+        commit = f.read()
+
+    reader = BM25Index.load(str(tmp_path), read_only=True)
+    with pytest.raises(RuntimeError):
+        reader.add_nodes(make_nodes(5, 1))
+    with pytest.raises(RuntimeError):
+        reader.delete_nodes(["n0"])
+    docs = {node.node_id: node for node in make_nodes(1, 5)}
+    assert reader.reconcile(docs) == (1, 1)
+    assert top_id(reader, "keyword5") == "n5"
+    with open(tmp_path / COMMIT_FILE, "rb") as f:
+        assert f.read() == commit
+
+
+def test_concurrent_read_only_loads_see_committed_state(tmp_path):
+    batch, batches = 5, 40
+    writer = BM25Index(persist_dir=str(tmp_path))
+    writer.add_nodes(make_nodes(0, batch))
+    errors = []
+    done = threading.Event()
+
+    def append():
+        try:
+            for start in range(batch, batch * batches, batch):
+                writer.add_nodes(make_nodes(start, batch))
+        finally:
+            done.set()
+
+    def load():
+        while not done.is_set():
+            try:
+                reader = BM25Index.load(str(tmp_path), read_only=True)
+                assert reader.num_docs % batch == 0
+                assert reader.node_ids == [f"n{i}" for i in range(reader.num_docs)]
+                last = reader.num_docs - 1
+                assert top_id(reader, f"keyword{last}") == f"n{last}"
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=append)] + [threading.Thread(target=load) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert BM25Index.load(str(tmp_path)).num_docs == batch * batches
@@ -0,0 +1,107 @@
+import os
+import zipfile
+
+import pytest
+
+from RAG.manifest import FileManifest, SyncPlan
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "a.txt").write_text("alpha")
+    (root / "b.txt").write_text("beta")
+    (root / ".hidden").write_text("skipped")
+    return root
+
+
+def record_all(manifest, plan):
+    sources = [(f"{os.path.basename(path)}-doc", path) for path in plan.to_parse]
+    manifest.record_sources(plan, sources)
+
+
+def zip_table():
+    return {"one.txt": {"crc": 1, "size": 3, "doc_ids": ["one-doc"]},
+            "two.txt": {"crc": 2, "size": 3, "doc_ids": ["two-doc"]}}
+
+
+def test_new_files_are_added(tmp_path, corpus):
+    manifest = FileManifest(str(tmp_path / "manifest.json"))
+    plan = manifest.scan(str(corpus))
+    assert sorted(map(os.path.basename, plan.added)) == ["a.txt", "b.txt"]
+    assert not (plan.modified or plan.deleted or plan.unchanged)
+
+
+def test_recorded_files_are_unchanged_after_reload(tmp_path, corpus):
+    path = str(tmp_path / "manifest.json")
+    manifest = FileManifest(path)
+    record_all(manifest, manifest.scan(str(corpus)))
+
+    plan = FileManifest(path).scan(str(corpus))
+    assert plan.is_empty()
+    assert len(plan.unchanged) == 2
+    assert manifest.doc_ids_for([str(corpus / "a.txt")]) == ["a.txt-doc"]
+
+
+def test_modified_and_deleted_files(tmp_path, corpus):
+    manifest = FileManifest(str(tmp_path / "manifest.json"))
+    record_all(manifest, manifest.scan(str(corpus)))
+    (corpus / "a.txt").write_text("alpha, edited")
+    os.remove(corpus / "b.txt")
+    (corpus / "c.txt").write_text("gamma")
+
+    plan = manifest.scan(str(corpus))
+    assert plan.modified == [str(corpus / "a.txt")]
+    assert plan.deleted == [str(corpus / "b.txt")]
+    assert plan.added == [str(corpus / "c.txt")]
+    assert sorted(plan.to_remove) == sorted([str(corpus / "a.txt"), str(corpus / "b.txt")])
+
+    record_all(manifest, plan)
+    assert str(corpus / "b.txt") not in manifest.files
+
+
+def test_touched_file_with_same_content_is_unchanged(tmp_path, corpus):
+    manifest = FileManifest(str(tmp_path / "manifest.json"))
+    record_all(manifest, manifest.scan(str(corpus)))
+    stat = os.stat(corpus / "a.txt")
+    os.utime(corpus / "a.txt", (stat.st_atime, stat.st_mtime + 10))
+
+    plan = manifest.scan(str(corpus))
+    assert plan.is_empty()
+    assert manifest.files[str(corpus / "a.txt")]["mtime"] == stat.st_mtime + 10
+
+
+def test_files_outside_the_scanned_root_are_kept(tmp_path, corpus):
+    manifest = FileManifest(str(tmp_path / "manifest.json"))
+    manifest.files["/elsewhere/x.txt"] = {"size": 1, "mtime": 0, "sha256": "", "doc_ids": []}
+    assert manifest.scan(str(corpus)).deleted == []
+
+
+def test_zip_members(tmp_path, corpus):
+    zip_path = str(corpus / "bundle.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("one.txt", "one")
+        archive.writestr("two.txt", "two")
+    manifest = FileManifest(str(tmp_path / "manifest.json"))
+    plan = manifest.scan(str(corpus))
+    manifest.record_sources(plan, [("a-doc", str(corpus / "a.txt"))], zip_members={zip_path: zip_table()})
+
+    assert sorted(manifest.doc_ids_for([zip_path])) == ["one-doc", "two-doc"]
+    table = manifest.zip_members(zip_path)
+    assert table == zip_table()
+    table["one.txt"]["crc"] = 99
+    del table["two.txt"]
+    assert manifest.zip_members(zip_path) == zip_table()
+    assert manifest.scan(str(corpus)).is_empty()
+
+
+def test_zip_with_failed_member_is_synced_again(tmp_path, corpus):
+    zip_path = str(corpus / "bundle.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("one.txt", "one")
+    manifest = FileManifest(str(tmp_path / "manifest.json"))
+    plan = SyncPlan(root=str(corpus), added=[zip_path])
+    manifest.record_sources(plan, [], zip_members={zip_path: {"one.txt": {"failed": True}}})
+
+    assert manifest.scan(str(corpus)).modified == [zip_path]
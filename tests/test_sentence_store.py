@@ -0,0 +1,51 @@
+import pytest
+
+from RAG.sentence_windows import SentenceStore
+
+SENTENCES = ["The farm produced power.", "Output fell in winter.", "Storage smoothed demand."]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SentenceStore(str(tmp_path / "sentences.sqlite"))
+    yield store
+    store.close()
+
+
+def test_identical_documents_share_one_entry(store):
+    key = store.put(SENTENCES, "doc-a")
+    assert store.put(list(SENTENCES), "doc-b") == key
+    assert store.get(key) == SENTENCES
+    assert store.window((key, 1, 3)) == "Output fell in winter. Storage smoothed demand."
+
+
+def test_entry_outlives_all_but_its_last_document(store):
+    key = store.put(SENTENCES, "doc-a")
+    store.put(SENTENCES, "doc-b")
+
+    assert store.remove_documents(["doc-a"]) == 0
+    assert store.get(key) == SENTENCES
+    assert store.remove_documents(["doc-b"]) == 1
+    assert store.get(key) is None
+    assert store.window((key, 0, 1)) is None
+
+
+def test_removing_documents_keeps_other_entries(store):
+    removed = store.put(SENTENCES, "doc-a")
+    kept = store.put(["Another document."], "doc-b")
+    assert store.get(removed) == SENTENCES  # cached before removal
+
+    assert store.remove_documents(["doc-a", "unknown"]) == 1
+    assert store.get(removed) is None
+    assert store.get(kept) == ["Another document."]
+    assert store.remove_documents([]) == 0
+
+
+def test_removal_is_persisted(tmp_path, store):
+    key = store.put(SENTENCES, "doc-a")
+    store.remove_documents(["doc-a"])
+    reopened = SentenceStore(str(tmp_path / "sentences.sqlite"))
+    try:
+        assert reopened.get(key) is None
+    finally:
+        reopened.close()
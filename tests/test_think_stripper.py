@@ -0,0 +1,37 @@
+import pytest
+
+from RAG.query_eng import ThinkStripper
+
+
+def strip(tokens):
+    stripper = ThinkStripper()
+    return "".join(stripper.feed(token) for token in tokens) + stripper.flush()
+
+
+@pytest.mark.parametrize("tokens", [
+    ["<think>plan</think>Answer"],
+    ["<th", "ink>plan</th", "ink>Answer"],
+    ["<", "t", "h", "i", "n", "k", ">", "plan", "<", "/", "think", ">", "Answer"],
+    ["<think>", "plan", "</think>", "\n\n", "Answer"],
+])
+def test_think_block_split_across_tokens(tokens):
+    assert strip(tokens) == "Answer"
+
+
+def test_text_around_a_think_block_is_kept():
+    assert strip(["Hel", "lo <th", "ink>secret</thi", "nk> world"]) == "Hello  world"
+
+
+def test_partial_tag_is_held_back_until_resolved():
+    stripper = ThinkStripper()
+    assert stripper.feed("a <thi") == "a "
+    assert stripper.feed("s is not a tag") == "<this is not a tag"
+
+
+def test_flush_emits_held_back_text_but_not_an_unclosed_block():
+    assert strip(["result <thi"]) == "result <thi"
+    assert strip(["result <think>never closed"]) == "result "
+
+
+def test_leading_whitespace_is_dropped_only_at_the_start():
+    assert strip(["  ", "\n", "First", "  second"]) == "First  second"